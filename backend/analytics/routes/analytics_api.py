@@ -3,16 +3,78 @@ Analytics API Routes
 Provides endpoints for the analytics dashboard (Admin Only)
 """
 
-from flask import Blueprint, jsonify, request, session
-from analytics.services import SuspectScorer, TimeAnalyzer, PlayerAnalytics
-import config
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 
-analytics_bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
+from flask import Blueprint, Response, current_app, request, session
+from services.json_response import fast_json
 
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
 
-def get_db_path():
-    """Get database path from config"""
-    return config.DATABASE_PATH
+# Dashboards poll these endpoints, so successful responses are kept briefly
+CACHE_TTL_SECONDS = 30
+CACHE_MAX_ENTRIES = 256
+
+# Sections of /summary are independent, so they are fetched concurrently
+_summary_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='analytics-summary')
+
+_response_cache = {}
+_cache_lock = threading.Lock()
+_cache_version = 0
+
+
+def get_services():
+    """Get the application-scoped analytics services"""
+    return current_app.extensions['analytics']
+
+
+def cached(ttl: int = CACHE_TTL_SECONDS):
+    """
+    Cache successful responses of a GET handler for `ttl` seconds.
+    Entries are keyed by handler, URL arguments and query string, and are
+    dropped whenever invalidate_cache() is called.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (
+                _cache_version,
+                func.__qualname__,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True)))
+            )
+            now = time.monotonic()
+            entry = _response_cache.get(key)
+            if entry and entry[0] > now:
+                return current_app.response_class(entry[1], mimetype=entry[2])
+            
+            response = func(*args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                with _cache_lock:
+                    if len(_response_cache) >= CACHE_MAX_ENTRIES:
+                        _evict_expired(now)
+                    if len(_response_cache) >= CACHE_MAX_ENTRIES:
+                        _response_cache.pop(next(iter(_response_cache)))
+                    _response_cache[key] = (now + ttl, response.get_data(), response.mimetype)
+            return response
+        return wrapper
+    return decorator
+
+
+def _evict_expired(now: float):
+    """Remove expired cache entries (caller holds the lock)"""
+    for key in [k for k, entry in _response_cache.items() if entry[0] <= now]:
+        del _response_cache[key]
+
+
+def invalidate_cache():
+    """Drop all cached responses, e.g. after the scoring config changes"""
+    global _cache_version
+    with _cache_lock:
+        _cache_version += 1
+        _response_cache.clear()
 
 
 # ==========================================
@@ -20,74 +82,79 @@ def get_db_path():
 # ==========================================
 
 @analytics_bp.route('/suspects/rankings', methods=['GET'])
+@cached()
 def get_suspect_rankings():
     """Get all suspects ranked by suspicion score"""
     try:
-        scorer = SuspectScorer(get_db_path())
+        scorer = get_services()['scorer']
         rankings = scorer.get_suspect_rankings()
-        return jsonify({
+        return fast_json({
             'success': True,
             'rankings': rankings,
             'count': len(rankings)
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/suspects/chart-data', methods=['GET'])
+@cached()
 def get_suspect_chart_data():
     """Get data formatted for Chart.js stacked bar chart"""
     try:
-        scorer = SuspectScorer(get_db_path())
+        scorer = get_services()['scorer']
         data = scorer.get_score_breakdown_chart_data()
-        return jsonify({
+        return fast_json({
             'success': True,
             'data': data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/suspects/top', methods=['GET'])
+@cached()
 def get_top_suspects():
     """Get top N suspects by score"""
     limit = request.args.get('limit', 3, type=int)
     try:
-        scorer = SuspectScorer(get_db_path())
+        scorer = get_services()['scorer']
         suspects = scorer.get_top_suspects(limit)
-        return jsonify({
+        return fast_json({
             'success': True,
             'suspects': suspects
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/suspects/<int:suspect_id>', methods=['GET'])
+@cached()
 def get_suspect_detail(suspect_id):
     """Get detailed analytics for a single suspect"""
     try:
-        scorer = SuspectScorer(get_db_path())
+        scorer = get_services()['scorer']
         detail = scorer.get_suspect_detail(suspect_id)
         if detail:
-            return jsonify({'success': True, 'suspect': detail})
-        return jsonify({'success': False, 'error': 'Suspect not found'}), 404
+            return fast_json({'success': True, 'suspect': detail})
+        return fast_json({'success': False, 'error': 'Suspect not found'}), 404
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/config', methods=['GET'])
+@cached()
 def get_analytics_config():
     """Get current analytics configuration"""
     try:
-        scorer = SuspectScorer(get_db_path())
+        scorer = get_services()['scorer']
         config_data = scorer.get_config()
-        return jsonify({
+        return fast_json({
             'success': True,
             'config': config_data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/config', methods=['POST'])
@@ -98,14 +165,16 @@ def update_analytics_config():
     value = data.get('value')
     
     if not key or value is None:
-        return jsonify({'success': False, 'error': 'Missing key or value'}), 400
+        return fast_json({'success': False, 'error': 'Missing key or value'}), 400
     
     try:
-        scorer = SuspectScorer(get_db_path())
+        scorer = get_services()['scorer']
         success = scorer.update_config(key, float(value))
-        return jsonify({'success': success})
+        if success:
+            invalidate_cache()
+        return fast_json({'success': success})
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 # ==========================================
@@ -113,60 +182,64 @@ def update_analytics_config():
 # ==========================================
 
 @analytics_bp.route('/timeline/hourly', methods=['GET'])
+@cached()
 def get_hourly_timeline():
     """Get hourly activity breakdown for a date"""
     date = request.args.get('date', '2024-03-15')
     try:
-        analyzer = TimeAnalyzer(get_db_path())
+        analyzer = get_services()['time']
         data = analyzer.get_hourly_activity(date)
-        return jsonify({
+        return fast_json({
             'success': True,
             'data': data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/timeline/suspect/<int:suspect_id>', methods=['GET'])
+@cached()
 def get_suspect_timeline(suspect_id):
     """Get activity timeline for a specific suspect"""
     try:
-        analyzer = TimeAnalyzer(get_db_path())
+        analyzer = get_services()['time']
         data = analyzer.get_suspect_timeline(suspect_id)
-        return jsonify({
+        return fast_json({
             'success': True,
             'data': data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/timeline/comparison', methods=['GET'])
+@cached()
 def get_before_after_comparison():
     """Compare suspect activity before and after crime"""
     try:
-        analyzer = TimeAnalyzer(get_db_path())
+        analyzer = get_services()['time']
         data = analyzer.get_before_after_comparison()
-        return jsonify({
+        return fast_json({
             'success': True,
             'data': data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/timeline/heatmap', methods=['GET'])
+@cached()
 def get_activity_heatmap():
     """Get activity heatmap data"""
     try:
-        analyzer = TimeAnalyzer(get_db_path())
+        analyzer = get_services()['time']
         data = analyzer.get_activity_heatmap_data()
-        return jsonify({
+        return fast_json({
             'success': True,
             'data': data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 # ==========================================
@@ -174,87 +247,93 @@ def get_activity_heatmap():
 # ==========================================
 
 @analytics_bp.route('/players/funnel', methods=['GET'])
+@cached()
 def get_player_funnel():
     """Get level progression funnel analysis"""
     try:
-        analytics = PlayerAnalytics(get_db_path())
+        analytics = get_services()['players']
         data = analytics.get_funnel_analysis()
-        return jsonify({
+        return fast_json({
             'success': True,
             'data': data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/players/errors', methods=['GET'])
+@cached()
 def get_error_analysis():
     """Get common error analysis"""
     try:
-        analytics = PlayerAnalytics(get_db_path())
+        analytics = get_services()['players']
         data = analytics.get_error_analysis()
-        return jsonify({
+        return fast_json({
             'success': True,
             'data': data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/players/learning-curve', methods=['GET'])
+@cached()
 def get_learning_curve():
     """Get learning curve analysis"""
     try:
-        analytics = PlayerAnalytics(get_db_path())
+        analytics = get_services()['players']
         data = analytics.get_learning_curve()
-        return jsonify({
+        return fast_json({
             'success': True,
             'data': data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/players/sessions', methods=['GET'])
+@cached()
 def get_session_summary():
     """Get session statistics"""
     try:
-        analytics = PlayerAnalytics(get_db_path())
+        analytics = get_services()['players']
         data = analytics.get_session_summary()
-        return jsonify({
+        return fast_json({
             'success': True,
             'data': data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/players/queries', methods=['GET'])
+@cached()
 def get_query_stats():
     """Get query attempt statistics"""
     try:
-        analytics = PlayerAnalytics(get_db_path())
+        analytics = get_services()['players']
         data = analytics.get_query_stats()
-        return jsonify({
+        return fast_json({
             'success': True,
             'data': data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 @analytics_bp.route('/players/dashboard', methods=['GET'])
+@cached()
 def get_player_dashboard():
     """Get complete player analytics dashboard data"""
     try:
-        analytics = PlayerAnalytics(get_db_path())
+        analytics = get_services()['players']
         data = analytics.get_dashboard_summary()
-        return jsonify({
+        return fast_json({
             'success': True,
             'data': data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
 
 
 # ==========================================
@@ -262,21 +341,37 @@ def get_player_dashboard():
 # ==========================================
 
 @analytics_bp.route('/summary', methods=['GET'])
+@cached()
 def get_analytics_summary():
     """Get combined analytics summary for dashboard overview"""
     try:
-        scorer = SuspectScorer(get_db_path())
-        analyzer = TimeAnalyzer(get_db_path())
-        player_analytics = PlayerAnalytics(get_db_path())
+        scorer = get_services()['scorer']
+        analyzer = get_services()['time']
+        player_analytics = get_services()['players']
+        
+        # Flush once up front; the player sections then only read, each on
+        # its worker's read-only connection
+        player_analytics.flush_pending()
+        sections = {
+            'top_suspects': _summary_pool.submit(scorer.get_top_suspects, 3),
+            'comparison': _summary_pool.submit(analyzer.get_before_after_comparison),
+            'player_sessions': _summary_pool.submit(
+                player_analytics.run_read_only, player_analytics.get_session_summary
+            ),
+            'query_stats': _summary_pool.submit(
+                player_analytics.run_read_only, player_analytics.get_query_stats
+            )
+        }
+        results = {name: future.result() for name, future in sections.items()}
         
-        return jsonify({
+        return fast_json({
             'success': True,
             'data': {
-                'top_suspects': scorer.get_top_suspects(3),
-                'anomalies': analyzer.get_before_after_comparison().get('anomalies', []),
-                'player_sessions': player_analytics.get_session_summary(),
-                'query_stats': player_analytics.get_query_stats()
+                'top_suspects': results['top_suspects'],
+                'anomalies': results['comparison'].get('anomalies', []),
+                'player_sessions': results['player_sessions'],
+                'query_stats': results['query_stats']
             }
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return fast_json({'success': False, 'error': str(e)}), 500
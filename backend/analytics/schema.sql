@@ -39,6 +39,15 @@ CREATE TABLE IF NOT EXISTS session_logs (
     user_agent TEXT
 );
 
+-- Session Counter Deltas
+-- Append-only counter changes, rolled up into session_logs on read
+CREATE TABLE IF NOT EXISTS session_counter_deltas (
+    session_id VARCHAR(100) NOT NULL,
+    delta_queries INTEGER NOT NULL DEFAULT 0,
+    delta_levels INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Level Completions
 -- Records successful level completions
 CREATE TABLE IF NOT EXISTS level_completions (
@@ -62,11 +71,53 @@ CREATE TABLE IF NOT EXISTS error_logs (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Suspect Rankings (materialized)
+-- Per-suspect scores, rebuilt by SuspectScorer.refresh_rankings()
+CREATE TABLE IF NOT EXISTS suspect_rankings_mv (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    age INTEGER,
+    occupation VARCHAR(100),
+    criminal_record BOOLEAN,
+    criminal_score REAL NOT NULL DEFAULT 0,
+    crime_window_call_score REAL NOT NULL DEFAULT 0,
+    crime_window_calls INTEGER NOT NULL DEFAULT 0,
+    high_transaction_score REAL NOT NULL DEFAULT 0,
+    high_transactions INTEGER NOT NULL DEFAULT 0,
+    high_transaction_total REAL NOT NULL DEFAULT 0,
+    cctv_score REAL NOT NULL DEFAULT 0,
+    bank_sightings INTEGER NOT NULL DEFAULT 0,
+    volume_score REAL NOT NULL DEFAULT 0,
+    total_calls INTEGER NOT NULL DEFAULT 0,
+    total_score REAL NOT NULL DEFAULT 0
+);
+
 -- Indexes for query performance
 CREATE INDEX IF NOT EXISTS idx_query_attempts_session ON query_attempts(session_id);
-CREATE INDEX IF NOT EXISTS idx_query_attempts_level ON query_attempts(level_id);
 CREATE INDEX IF NOT EXISTS idx_query_attempts_created ON query_attempts(created_at);
 CREATE INDEX IF NOT EXISTS idx_level_completions_session ON level_completions(session_id);
-CREATE INDEX IF NOT EXISTS idx_level_completions_level ON level_completions(level_id);
-CREATE INDEX IF NOT EXISTS idx_error_logs_type ON error_logs(error_type);
 CREATE INDEX IF NOT EXISTS idx_session_logs_session ON session_logs(session_id);
+
+-- Covering indexes for the dashboard GROUP BY queries
+CREATE INDEX IF NOT EXISTS idx_query_attempts_level_session ON query_attempts(level_id, session_id);
+CREATE INDEX IF NOT EXISTS idx_level_completions_level_session ON level_completions(level_id, session_id);
+CREATE INDEX IF NOT EXISTS idx_error_logs_type_session ON error_logs(error_type, session_id);
+CREATE INDEX IF NOT EXISTS idx_error_logs_level ON error_logs(level_id);
+CREATE INDEX IF NOT EXISTS idx_session_logs_started ON session_logs(started_at DESC);
+CREATE INDEX IF NOT EXISTS idx_mv_score ON suspect_rankings_mv(total_score DESC, id);
+
+-- Composite indexes on the case tables for the scoring and timeline
+-- queries: equality/filter column first, then the grouped or range column
+CREATE INDEX IF NOT EXISTS idx_phone_ts_caller ON phone_records(timestamp, caller_id);
+CREATE INDEX IF NOT EXISTS idx_phone_caller_ts ON phone_records(caller_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_txn_account_amount ON bank_transactions(account_id, amount);
+CREATE INDEX IF NOT EXISTS idx_cctv_person_loc ON cctv_logs(person_id, location_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_cctv_loc_person ON cctv_logs(location_id, person_id);
+CREATE INDEX IF NOT EXISTS idx_phone_receiver_ts ON phone_records(receiver_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_txn_account_ts ON bank_transactions(account_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_cctv_person_ts ON cctv_logs(person_id, timestamp);
+
+-- Superseded by the covering indexes above
+DROP INDEX IF EXISTS idx_query_attempts_level;
+DROP INDEX IF EXISTS idx_level_completions_level;
+DROP INDEX IF EXISTS idx_error_logs_type;
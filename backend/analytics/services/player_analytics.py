@@ -3,11 +3,235 @@ Player Behavior Analytics Module
 Analyzes player interactions with the SQL Detective Game
 """
 
+import atexit
+import json
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import uuid
 
+from .connections import ThreadLocalConnections, open_connection, transaction
+
+
+# Statements on the hot logging path, kept constant so sqlite's
+# statement cache can reuse the compiled form
+_SQL_INSERT_SESSION = """
+    INSERT INTO session_logs (session_id, user_agent)
+    VALUES (?, ?)
+    ON CONFLICT (session_id) DO NOTHING
+"""
+
+# Session counters are appended as deltas instead of updating the
+# session_logs row on every query, and rolled up when sessions are read
+_SQL_INSERT_SESSION_DELTA = """
+    INSERT INTO session_counter_deltas (session_id, delta_queries, delta_levels)
+    VALUES (?, ?, ?)
+"""
+
+_SQL_ROLL_UP_SESSION_DELTAS = """
+    UPDATE session_logs 
+    SET total_queries = total_queries + d.queries,
+        levels_completed = levels_completed + d.levels,
+        last_active_at = COALESCE(d.last_active, session_logs.last_active_at)
+    FROM (
+        SELECT 
+            session_id,
+            SUM(delta_queries) AS queries,
+            SUM(delta_levels) AS levels,
+            MAX(created_at) FILTER (WHERE delta_queries > 0) AS last_active
+        FROM session_counter_deltas
+        GROUP BY session_id
+    ) AS d
+    WHERE session_logs.session_id = d.session_id
+"""
+
+_SQL_CLEAR_SESSION_DELTAS = "DELETE FROM session_counter_deltas"
+
+_SQL_INSERT_QUERY_ATTEMPT = """
+    INSERT INTO query_attempts 
+    (session_id, level_id, query_text, is_valid, is_correct, execution_time_ms, error_message)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+_SQL_INSERT_LEVEL_COMPLETION = """
+    INSERT INTO level_completions 
+    (session_id, level_id, attempts_count, time_spent_seconds)
+    VALUES (?, ?, ?, ?)
+"""
+
+_SQL_INSERT_ERROR = """
+    INSERT INTO error_logs 
+    (session_id, level_id, error_type, error_detail, query_fragment)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# Worker pool used to run independent dashboard queries concurrently
+_DASHBOARD_POOL = ThreadPoolExecutor(max_workers=5, thread_name_prefix='player-analytics')
+
+
+def _roll_up_session_deltas(conn: sqlite3.Connection):
+    """Fold pending session counter deltas into session_logs"""
+    with transaction(conn):
+        conn.execute(_SQL_ROLL_UP_SESSION_DELTAS)
+        conn.execute(_SQL_CLEAR_SESSION_DELTAS)
+
+
+class _AnalyticsWriteBuffer:
+    """
+    Collects gameplay analytics rows for one database and writes them in
+    batches: query attempts, level completions and errors, together with
+    the session counter deltas they imply. A background thread flushes the
+    buffer every FLUSH_INTERVAL_SECONDS, or as soon as it holds
+    FLUSH_THRESHOLD rows. A batch that hits a locked or busy database is
+    queued again for the next flush; if sqlite rejects rows in it, the
+    batch is written row by row and only the rejected rows are dropped. Past MAX_PENDING rows new ones are dropped, so a stuck
+    writer can't grow memory without bound.
+    """
+    
+    FLUSH_THRESHOLD = 32
+    FLUSH_INTERVAL_SECONDS = 1.0
+    MAX_PENDING = 10_000
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._attempts: List[tuple] = []
+        self._completions: List[tuple] = []
+        self._errors: List[tuple] = []
+        self._count = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+    
+    def _add(self, pending: List[tuple], row: tuple) -> bool:
+        with self._lock:
+            if self._count >= self.MAX_PENDING:
+                return False
+            pending.append(row)
+            self._count += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='analytics-writer', daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush)
+            full = self._count >= self.FLUSH_THRESHOLD
+        if full:
+            self._wakeup.set()
+        return True
+    
+    def add_attempt(self, attempt: tuple) -> bool:
+        """Queue a query_attempts row"""
+        return self._add(self._attempts, attempt)
+    
+    def add_completion(self, completion: tuple) -> bool:
+        """Queue a level_completions row"""
+        return self._add(self._completions, completion)
+    
+    def add_error(self, error: tuple) -> bool:
+        """Queue an error_logs row"""
+        return self._add(self._errors, error)
+    
+    def flush(self, conn: sqlite3.Connection = None) -> bool:
+        """Write all pending rows and their session deltas in one transaction"""
+        with self._lock:
+            attempts, self._attempts = self._attempts, []
+            completions, self._completions = self._completions, []
+            errors, self._errors = self._errors, []
+            self._count = 0
+        if not (attempts or completions or errors):
+            return True
+        
+        if conn is None:
+            conn = open_connection(self.db_path)
+        deltas = [(attempt[0], 1, 0) for attempt in attempts]
+        deltas += [(completion[0], 0, 1) for completion in completions]
+        try:
+            with transaction(conn):
+                conn.executemany(_SQL_INSERT_QUERY_ATTEMPT, attempts)
+                conn.executemany(_SQL_INSERT_LEVEL_COMPLETION, completions)
+                conn.executemany(_SQL_INSERT_ERROR, errors)
+                conn.executemany(_SQL_INSERT_SESSION_DELTA, deltas)
+            return True
+        except sqlite3.OperationalError as e:
+            # Locked or busy: keep the batch for the next flush
+            print(f"Error writing analytics batch: {e}")
+            self._requeue(attempts, completions, errors)
+            return False
+        except (sqlite3.IntegrityError, sqlite3.InterfaceError) as e:
+            print(f"Error writing analytics batch, retrying row by row: {e}")
+        
+        try:
+            self._write_rows(conn, attempts, completions, errors)
+            return True
+        except sqlite3.OperationalError as e:
+            print(f"Error writing analytics batch: {e}")
+            self._requeue(attempts, completions, errors)
+            return False
+    
+    @staticmethod
+    def _write_rows(conn: sqlite3.Connection, attempts: List[tuple],
+                    completions: List[tuple], errors: List[tuple]):
+        """
+        Write a batch one row at a time, dropping the rows sqlite rejects.
+        A failed statement only undoes itself, so the good rows still
+        commit together with the session deltas for them.
+        """
+        with transaction(conn):
+            for sql, rows, delta in (
+                (_SQL_INSERT_QUERY_ATTEMPT, attempts, (1, 0)),
+                (_SQL_INSERT_LEVEL_COMPLETION, completions, (0, 1)),
+                (_SQL_INSERT_ERROR, errors, None),
+            ):
+                for row in rows:
+                    try:
+                        conn.execute(sql, row)
+                    except (sqlite3.IntegrityError, sqlite3.InterfaceError) as e:
+                        print(f"Dropping analytics row: {e}")
+                        continue
+                    if delta is not None:
+                        conn.execute(_SQL_INSERT_SESSION_DELTA, (row[0],) + delta)
+    
+    def _requeue(self, attempts: List[tuple], completions: List[tuple], errors: List[tuple]):
+        """
+        Put a batch that failed to write back ahead of the rows queued
+        since, so the next flush retries it. If that exceeds MAX_PENDING
+        the newest rows are dropped, as they would have been when queued.
+        """
+        with self._lock:
+            excess = len(attempts) + len(completions) + len(errors) + self._count - self.MAX_PENDING
+            for pending in (self._errors, self._completions, self._attempts):
+                if excess <= 0:
+                    break
+                dropped = min(excess, len(pending))
+                del pending[len(pending) - dropped:]
+                excess -= dropped
+            self._attempts = attempts + self._attempts
+            self._completions = completions + self._completions
+            self._errors = errors + self._errors
+            self._count = len(self._attempts) + len(self._completions) + len(self._errors)
+    
+    def _run(self):
+        conn = open_connection(self.db_path)
+        while True:
+            self._wakeup.wait(self.FLUSH_INTERVAL_SECONDS)
+            self._wakeup.clear()
+            self.flush(conn)
+
+
+_write_buffers: Dict[str, _AnalyticsWriteBuffer] = {}
+_write_buffers_lock = threading.Lock()
+
+
+def _get_write_buffer(db_path: str) -> _AnalyticsWriteBuffer:
+    """Get the shared analytics write buffer for a database file"""
+    with _write_buffers_lock:
+        buffer = _write_buffers.get(db_path)
+        if buffer is None:
+            buffer = _write_buffers[db_path] = _AnalyticsWriteBuffer(db_path)
+        return buffer
+
 
 class PlayerAnalytics:
     """
@@ -20,12 +244,27 @@ class PlayerAnalytics:
     
     def __init__(self, db_path: str):
         self.db_path = db_path
+        self._connections = ThreadLocalConnections(db_path)
+        self._writes = _get_write_buffer(db_path)
+    
+    def _conn(self) -> sqlite3.Connection:
+        """Get this thread's cached database connection"""
+        return self._connections.get()
+    
+    def _read_only_conn(self) -> sqlite3.Connection:
+        """Get this thread's cached read-only connection for dashboard queries"""
+        return self._connections.get_read_only()
     
-    def _get_connection(self) -> sqlite3.Connection:
-        """Get database connection with row factory"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    def flush_pending(self) -> bool:
+        """Write buffered analytics rows and roll up session counters so reads see them"""
+        conn = self._conn()
+        flushed = self._writes.flush(conn)
+        try:
+            _roll_up_session_deltas(conn)
+        except Exception as e:
+            print(f"Error rolling up session counters: {e}")
+            return False
+        return flushed
     
     # ==========================================
     # Logging Methods (called during gameplay)
@@ -33,169 +272,104 @@ class PlayerAnalytics:
     
     def log_session_start(self, session_id: str, user_agent: str = None) -> bool:
         """Log a new player session"""
-        conn = sqlite3.connect(self.db_path)
         try:
-            conn.execute("""
-                INSERT OR IGNORE INTO session_logs (session_id, user_agent)
-                VALUES (?, ?)
-            """, (session_id, user_agent))
-            conn.commit()
+            self._conn().execute(_SQL_INSERT_SESSION, (session_id, user_agent))
             return True
         except Exception as e:
             print(f"Error logging session: {e}")
             return False
-        finally:
-            conn.close()
     
     def update_session_activity(self, session_id: str) -> bool:
         """Update last active timestamp for session"""
-        conn = sqlite3.connect(self.db_path)
         try:
-            conn.execute("""
-                UPDATE session_logs 
-                SET last_active_at = CURRENT_TIMESTAMP,
-                    total_queries = total_queries + 1
-                WHERE session_id = ?
-            """, (session_id,))
-            conn.commit()
+            self._conn().execute(_SQL_INSERT_SESSION_DELTA, (session_id, 1, 0))
             return True
         except Exception:
             return False
-        finally:
-            conn.close()
     
     def log_query_attempt(self, session_id: str, level_id: int, query_text: str,
                           is_valid: bool, is_correct: bool = None,
                           execution_time_ms: int = None, error_message: str = None) -> bool:
-        """Log a query attempt"""
-        conn = sqlite3.connect(self.db_path)
-        try:
-            conn.execute("""
-                INSERT INTO query_attempts 
-                (session_id, level_id, query_text, is_valid, is_correct, execution_time_ms, error_message)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (session_id, level_id, query_text, is_valid, is_correct, execution_time_ms, error_message))
-            conn.commit()
-            
-            # Update session activity
-            self.update_session_activity(session_id)
-            return True
-        except Exception as e:
-            print(f"Error logging query attempt: {e}")
-            return False
-        finally:
-            conn.close()
+        """
+        Log a query attempt.
+        Attempts are buffered and written in batches together with the
+        session counter deltas.
+        """
+        return self._writes.add_attempt((session_id, level_id, query_text, is_valid, is_correct,
+                                         execution_time_ms, error_message))
     
     def log_level_completion(self, session_id: str, level_id: int, 
                              attempts_count: int, time_spent_seconds: int = None) -> bool:
-        """Log a successful level completion"""
-        conn = sqlite3.connect(self.db_path)
-        try:
-            conn.execute("""
-                INSERT INTO level_completions 
-                (session_id, level_id, attempts_count, time_spent_seconds)
-                VALUES (?, ?, ?, ?)
-            """, (session_id, level_id, attempts_count, time_spent_seconds))
-            
-            # Update session levels completed
-            conn.execute("""
-                UPDATE session_logs 
-                SET levels_completed = levels_completed + 1
-                WHERE session_id = ?
-            """, (session_id,))
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error logging level completion: {e}")
-            return False
-        finally:
-            conn.close()
+        """Log a successful level completion (buffered like query attempts)"""
+        return self._writes.add_completion((session_id, level_id, attempts_count, time_spent_seconds))
     
     def log_error(self, session_id: str, level_id: int, error_type: str,
                   error_detail: str = None, query_fragment: str = None) -> bool:
-        """Log a categorized error"""
-        conn = sqlite3.connect(self.db_path)
-        try:
-            conn.execute("""
-                INSERT INTO error_logs 
-                (session_id, level_id, error_type, error_detail, query_fragment)
-                VALUES (?, ?, ?, ?, ?)
-            """, (session_id, level_id, error_type, error_detail, query_fragment))
-            conn.commit()
-            return True
-        except Exception:
-            return False
-        finally:
-            conn.close()
+        """Log a categorized error (buffered like query attempts)"""
+        return self._writes.add_error((session_id, level_id, error_type, error_detail, query_fragment))
     
     # ==========================================
     # Analytics Methods (for dashboard)
     # ==========================================
     
-    def get_funnel_analysis(self) -> Dict[str, Any]:
+    def get_funnel_analysis(self, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
         """
         Analyze player progression through levels.
         Shows drop-off at each level.
         """
-        conn = self._get_connection()
-        try:
-            query = """
-            WITH level_starts AS (
-                SELECT level_id, COUNT(DISTINCT session_id) AS sessions_started
-                FROM query_attempts
-                GROUP BY level_id
-            ),
-            level_completions_agg AS (
-                SELECT level_id, COUNT(DISTINCT session_id) AS sessions_completed
-                FROM level_completions
-                GROUP BY level_id
-            )
-            SELECT 
-                ls.level_id,
-                ls.sessions_started,
-                COALESCE(lc.sessions_completed, 0) AS sessions_completed,
-                ROUND(COALESCE(lc.sessions_completed, 0) * 100.0 / 
-                    NULLIF(ls.sessions_started, 0), 1) AS completion_rate,
-                LAG(ls.sessions_started) OVER (ORDER BY ls.level_id) AS prev_level_starts,
-                CASE 
-                    WHEN LAG(ls.sessions_started) OVER (ORDER BY ls.level_id) IS NULL THEN 0
-                    ELSE ROUND(
-                        (LAG(ls.sessions_started) OVER (ORDER BY ls.level_id) - ls.sessions_started) * 100.0 
-                        / NULLIF(LAG(ls.sessions_started) OVER (ORDER BY ls.level_id), 0), 1
-                    )
-                END AS dropoff_rate
-            FROM level_starts ls
-            LEFT JOIN level_completions_agg lc ON ls.level_id = lc.level_id
-            ORDER BY ls.level_id;
-            """
-            
-            cursor = conn.execute(query)
-            levels = []
-            for row in cursor.fetchall():
-                levels.append({
-                    'level_id': row['level_id'],
-                    'started': row['sessions_started'],
-                    'completed': row['sessions_completed'],
-                    'completion_rate': row['completion_rate'] or 0,
-                    'dropoff_rate': row['dropoff_rate'] or 0
-                })
-            
-            return {
-                'levels': levels,
-                'total_sessions': levels[0]['started'] if levels else 0,
-                'fully_completed': levels[-1]['completed'] if levels else 0
-            }
-        finally:
-            conn.close()
+        if conn is None:
+            conn = self._conn()
+            self._writes.flush(conn)
+        query = """
+        WITH level_starts AS (
+            SELECT level_id, COUNT(DISTINCT session_id) AS sessions_started
+            FROM query_attempts
+            GROUP BY level_id
+        ),
+        level_completions_agg AS (
+            SELECT level_id, COUNT(DISTINCT session_id) AS sessions_completed
+            FROM level_completions
+            GROUP BY level_id
+        )
+        SELECT 
+            ls.level_id,
+            ls.sessions_started AS started,
+            COALESCE(lc.sessions_completed, 0) AS completed,
+            COALESCE(ROUND(COALESCE(lc.sessions_completed, 0) * 100.0 / 
+                NULLIF(ls.sessions_started, 0), 1), 0) AS completion_rate,
+            CASE 
+                WHEN LAG(ls.sessions_started) OVER (ORDER BY ls.level_id) IS NULL THEN 0
+                ELSE COALESCE(ROUND(
+                    (LAG(ls.sessions_started) OVER (ORDER BY ls.level_id) - ls.sessions_started) * 100.0 
+                    / NULLIF(LAG(ls.sessions_started) OVER (ORDER BY ls.level_id), 0), 1
+                ), 0)
+            END AS dropoff_rate
+        FROM level_starts ls
+        LEFT JOIN level_completions_agg lc ON ls.level_id = lc.level_id
+        ORDER BY ls.level_id;
+        """
+        
+        # Column names match the response keys, so rows map directly
+        cursor = conn.execute(query)
+        levels = [dict(row) for row in cursor]
+        
+        return {
+            'levels': levels,
+            'total_sessions': levels[0]['started'] if levels else 0,
+            'fully_completed': levels[-1]['completed'] if levels else 0
+        }
     
-    def get_error_analysis(self) -> Dict[str, Any]:
+    def get_error_analysis(self, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
         """
         Analyze common SQL errors made by players.
         """
-        conn = self._get_connection()
-        try:
-            # Error frequency
-            cursor = conn.execute("""
+        if conn is None:
+            conn = self._conn()
+            self._writes.flush(conn)
+        # Error frequency (with each type's share of the top errors) and
+        # per-level counts in one statement, split by the kind column
+        cursor = conn.execute("""
+            WITH top_errors AS (
                 SELECT 
                     error_type,
                     COUNT(*) AS occurrence_count,
@@ -203,172 +377,169 @@ class PlayerAnalytics:
                 FROM error_logs
                 GROUP BY error_type
                 ORDER BY occurrence_count DESC
-                LIMIT 10;
-            """)
-            
-            errors = []
-            total_errors = 0
-            for row in cursor.fetchall():
-                errors.append({
-                    'type': row['error_type'],
-                    'count': row['occurrence_count'],
-                    'sessions': row['affected_sessions']
-                })
-                total_errors += row['occurrence_count']
-            
-            # Add percentages
-            for error in errors:
-                error['percentage'] = round(error['count'] * 100 / total_errors, 1) if total_errors > 0 else 0
-            
-            # Errors by level
-            cursor = conn.execute("""
+                LIMIT 10
+            ),
+            level_errors AS (
                 SELECT 
                     level_id,
                     COUNT(*) AS error_count
                 FROM error_logs
                 GROUP BY level_id
-                ORDER BY level_id;
-            """)
-            
-            by_level = [{
-                'level_id': row['level_id'],
-                'error_count': row['error_count']
-            } for row in cursor.fetchall()]
-            
-            return {
-                'top_errors': errors,
-                'total_errors': total_errors,
-                'by_level': by_level
-            }
-        finally:
-            conn.close()
+            )
+            SELECT 
+                'type' AS kind,
+                error_type AS type,
+                occurrence_count AS count,
+                affected_sessions AS sessions,
+                ROUND(occurrence_count * 100.0 / SUM(occurrence_count) OVER (), 1) AS percentage,
+                NULL AS level_id,
+                -occurrence_count AS sort_key
+            FROM top_errors
+            UNION ALL
+            SELECT 'level', NULL, error_count, NULL, NULL, level_id, level_id
+            FROM level_errors
+            ORDER BY kind DESC, sort_key;
+        """)
+        
+        errors = []
+        by_level = []
+        for row in cursor:
+            if row['kind'] == 'type':
+                errors.append({
+                    'type': row['type'],
+                    'count': row['count'],
+                    'sessions': row['sessions'],
+                    'percentage': row['percentage']
+                })
+            else:
+                by_level.append({
+                    'level_id': row['level_id'],
+                    'error_count': row['count']
+                })
+        total_errors = sum(error['count'] for error in errors)
+        
+        return {
+            'top_errors': errors,
+            'total_errors': total_errors,
+            'by_level': by_level
+        }
     
-    def get_learning_curve(self) -> Dict[str, Any]:
+    def get_learning_curve(self, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
         """
         Analyze learning curve - attempts and time per level.
+        Each level carries its difficulty_rank (1 = most attempts needed).
         """
-        conn = self._get_connection()
-        try:
-            cursor = conn.execute("""
-                SELECT 
-                    level_id,
-                    ROUND(AVG(attempts_count), 1) AS avg_attempts,
-                    MIN(attempts_count) AS min_attempts,
-                    MAX(attempts_count) AS max_attempts,
-                    ROUND(AVG(time_spent_seconds), 0) AS avg_time_seconds,
-                    COUNT(*) AS completions
-                FROM level_completions
-                GROUP BY level_id
-                ORDER BY level_id;
-            """)
-            
-            levels = []
-            for row in cursor.fetchall():
-                levels.append({
-                    'level_id': row['level_id'],
-                    'avg_attempts': row['avg_attempts'],
-                    'min_attempts': row['min_attempts'],
-                    'max_attempts': row['max_attempts'],
-                    'avg_time_seconds': row['avg_time_seconds'],
-                    'completions': row['completions']
-                })
-            
-            return {
-                'levels': levels,
-                'difficulty_ranking': sorted(levels, key=lambda x: x['avg_attempts'], reverse=True)
-            }
-        finally:
-            conn.close()
+        if conn is None:
+            conn = self._conn()
+            self._writes.flush(conn)
+        cursor = conn.execute("""
+            SELECT 
+                level_id,
+                ROUND(AVG(attempts_count), 1) AS avg_attempts,
+                MIN(attempts_count) AS min_attempts,
+                MAX(attempts_count) AS max_attempts,
+                ROUND(AVG(time_spent_seconds), 0) AS avg_time_seconds,
+                COUNT(*) AS completions,
+                RANK() OVER (ORDER BY AVG(attempts_count) DESC) AS difficulty_rank
+            FROM level_completions
+            GROUP BY level_id
+            ORDER BY level_id;
+        """)
+        
+        return {
+            'levels': [dict(row) for row in cursor]
+        }
     
-    def get_session_summary(self) -> Dict[str, Any]:
+    def get_session_summary(self, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
         """
         Get summary of all player sessions.
         """
-        conn = self._get_connection()
-        try:
-            cursor = conn.execute("""
-                SELECT 
-                    COUNT(*) AS total_sessions,
-                    SUM(levels_completed) AS total_completions,
-                    SUM(total_queries) AS total_queries,
-                    ROUND(AVG(levels_completed), 1) AS avg_levels_per_session,
-                    ROUND(AVG(total_queries), 1) AS avg_queries_per_session
-                FROM session_logs;
-            """)
-            
-            row = cursor.fetchone()
-            
-            # Recent sessions
-            cursor = conn.execute("""
-                SELECT 
-                    session_id,
-                    started_at,
-                    last_active_at,
-                    levels_completed,
-                    total_queries
-                FROM session_logs
-                ORDER BY started_at DESC
-                LIMIT 10;
-            """)
-            
-            recent = [{
-                'session_id': r['session_id'][:8] + '...',
-                'started': r['started_at'],
-                'last_active': r['last_active_at'],
-                'levels': r['levels_completed'],
-                'queries': r['total_queries']
-            } for r in cursor.fetchall()]
-            
-            return {
-                'total_sessions': row['total_sessions'] or 0,
-                'total_completions': row['total_completions'] or 0,
-                'total_queries': row['total_queries'] or 0,
-                'avg_levels_per_session': row['avg_levels_per_session'] or 0,
-                'avg_queries_per_session': row['avg_queries_per_session'] or 0,
-                'recent_sessions': recent
-            }
-        finally:
-            conn.close()
+        if conn is None:
+            conn = self._conn()
+            self.flush_pending()
+        # Aggregates and the recent sessions (ids shortened for display)
+        # come back from one statement over a single snapshot
+        cursor = conn.execute("""
+            SELECT 
+                COUNT(*) AS total_sessions,
+                COALESCE(SUM(levels_completed), 0) AS total_completions,
+                COALESCE(SUM(total_queries), 0) AS total_queries,
+                COALESCE(ROUND(AVG(levels_completed), 1), 0) AS avg_levels_per_session,
+                COALESCE(ROUND(AVG(total_queries), 1), 0) AS avg_queries_per_session,
+                (
+                    SELECT json_group_array(json_object(
+                        'session_id', substr(session_id, 1, 8) || '...',
+                        'started', started_at,
+                        'last_active', last_active_at,
+                        'levels', levels_completed,
+                        'queries', total_queries
+                    ))
+                    FROM (
+                        SELECT * FROM session_logs
+                        ORDER BY started_at DESC
+                        LIMIT 10
+                    )
+                ) AS recent_sessions
+            FROM session_logs;
+        """)
+        
+        summary = dict(cursor.fetchone())
+        summary['recent_sessions'] = json.loads(summary['recent_sessions'])
+        return summary
     
-    def get_query_stats(self) -> Dict[str, Any]:
+    def get_query_stats(self, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
         """
         Get statistics about query attempts.
         """
-        conn = self._get_connection()
-        try:
-            cursor = conn.execute("""
+        if conn is None:
+            conn = self._conn()
+            self._writes.flush(conn)
+        # Counts and rates come out of a single aggregate pass in SQLite
+        cursor = conn.execute("""
+            SELECT 
+                total_queries,
+                valid_queries,
+                correct_queries,
+                COALESCE(ROUND((total_queries - valid_queries) * 100.0 / 
+                    NULLIF(total_queries, 0), 1), 0) AS invalid_rate,
+                COALESCE(ROUND(correct_queries * 100.0 / 
+                    NULLIF(total_queries, 0), 1), 0) AS success_rate,
+                avg_execution_time_ms
+            FROM (
                 SELECT 
                     COUNT(*) AS total_queries,
-                    SUM(CASE WHEN is_valid = 1 THEN 1 ELSE 0 END) AS valid_queries,
-                    SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END) AS correct_queries,
-                    ROUND(AVG(execution_time_ms), 0) AS avg_execution_time
-                FROM query_attempts;
-            """)
-            
-            row = cursor.fetchone()
-            total = row['total_queries'] or 0
-            valid = row['valid_queries'] or 0
-            correct = row['correct_queries'] or 0
-            
-            return {
-                'total_queries': total,
-                'valid_queries': valid,
-                'correct_queries': correct,
-                'invalid_rate': round((total - valid) * 100 / total, 1) if total > 0 else 0,
-                'success_rate': round(correct * 100 / total, 1) if total > 0 else 0,
-                'avg_execution_time_ms': row['avg_execution_time'] or 0
-            }
-        finally:
-            conn.close()
+                    COALESCE(SUM(is_valid), 0) AS valid_queries,
+                    COALESCE(SUM(is_correct), 0) AS correct_queries,
+                    COALESCE(ROUND(AVG(execution_time_ms), 0), 0) AS avg_execution_time_ms
+                FROM query_attempts
+            );
+        """)
+        
+        return dict(cursor.fetchone())
     
     def get_dashboard_summary(self) -> Dict[str, Any]:
         """
         Get complete dashboard summary with all metrics.
+        The independent queries run concurrently, each on its worker's
+        read-only connection.
         """
-        return {
-            'sessions': self.get_session_summary(),
-            'queries': self.get_query_stats(),
-            'funnel': self.get_funnel_analysis(),
-            'errors': self.get_error_analysis(),
-            'learning_curve': self.get_learning_curve()
+        self.flush_pending()
+        sections = {
+            'sessions': self.get_session_summary,
+            'queries': self.get_query_stats,
+            'funnel': self.get_funnel_analysis,
+            'errors': self.get_error_analysis,
+            'learning_curve': self.get_learning_curve
+        }
+        futures = {
+            key: _DASHBOARD_POOL.submit(self.run_read_only, method)
+            for key, method in sections.items()
         }
+        return {key: future.result() for key, future in futures.items()}
+    
+    def run_read_only(self, method):
+        """
+        Run an analytics method on the current thread's read-only connection.
+        Pending writes are not flushed; call flush_pending() first.
+        """
+        return method(conn=self._read_only_conn())
@@ -4,9 +4,65 @@ Computes suspicion scores for suspects based on behavioral signals
 """
 
 import sqlite3
-from typing import List, Dict, Any, Optional
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
+from .connections import ThreadLocalConnections, transaction
+
+
+# Column order unpacked by _ranking_from_row
+_RANKING_COLUMNS = """
+    id, name, age, occupation, criminal_record,
+    criminal_score, crime_window_call_score, crime_window_calls,
+    high_transaction_score, high_transactions, high_transaction_total,
+    cctv_score, bank_sightings, volume_score, total_calls, total_score
+"""
+
+_SQL_INSERT_RANKING = f"""
+    INSERT INTO suspect_rankings_mv ({_RANKING_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ROUND(?, 1))
+"""
+
+_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Changes whenever any process updates the scoring config (updated_at only
+# has one-second resolution, so the values are summed in as well)
+_SQL_CONFIG_STAMP = "SELECT MAX(updated_at), TOTAL(config_value) FROM analytics_config"
+
+
+def _ranking_from_row(row: tuple, rank: int) -> Dict[str, Any]:
+    """Shape a suspect_rankings_mv row (in _RANKING_COLUMNS order) into a ranking entry"""
+    (suspect_id, name, age, occupation, criminal_record,
+     criminal_score, call_score, call_count,
+     trans_score, trans_count, trans_total,
+     cctv_score, sighting_count, volume_score, total_calls, total_score) = row
+    return {
+        'id': suspect_id,
+        'name': name,
+        'age': age,
+        'occupation': occupation,
+        'criminal_record': bool(criminal_record),
+        'scores': {
+            'criminal': criminal_score,
+            'crime_calls': call_score,
+            'transactions': trans_score,
+            'cctv': cctv_score,
+            'volume': volume_score
+        },
+        'details': {
+            'crime_window_calls': call_count,
+            'high_transactions': trans_count,
+            'high_transaction_total': trans_total,
+            'bank_sightings': sighting_count,
+            'total_calls': total_calls
+        },
+        'total_score': total_score,
+        'rank': rank
+    }
+
 
 class SuspectScorer:
     """
@@ -16,226 +72,283 @@ class SuspectScorer:
     
     def __init__(self, db_path: str):
         self.db_path = db_path
+        self._connections = ThreadLocalConnections(db_path)
+        # Memoized rankings, keyed by a counter bumped on every rebuild here
+        # plus a stamp of the config, which another process may change
+        self._rankings_cache = None
+        self._rankings_lock = threading.Lock()
+        self._rankings_version = 0
+        # Chart series derived from the memoized rankings list
+        self._chart_cache = None
     
-    def _get_connection(self) -> sqlite3.Connection:
-        """Get database connection with row factory"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    @contextmanager
+    def _get_connection(self) -> Iterator[sqlite3.Connection]:
+        """Yield this thread's cached read-only connection"""
+        yield self._connections.get_read_only()
+    
+    @contextmanager
+    def _get_write_connection(self) -> Iterator[sqlite3.Connection]:
+        """Yield this thread's cached read-write connection"""
+        yield self._connections.get()
     
     def get_config(self) -> Dict[str, float]:
         """Retrieve all configuration values"""
-        conn = self._get_connection()
-        try:
+        with self._get_connection() as conn:
             cursor = conn.execute("SELECT config_key, config_value FROM analytics_config")
             return {row['config_key']: row['config_value'] for row in cursor.fetchall()}
-        finally:
-            conn.close()
     
     def update_config(self, key: str, value: float) -> bool:
-        """Update a configuration value"""
-        conn = sqlite3.connect(self.db_path)
-        try:
-            conn.execute(
+        """
+        Update a configuration value and rebuild the rankings with it.
+        Both happen in one transaction, so a failed rebuild also rolls
+        back the config change.
+        """
+        with self._get_write_connection() as conn, transaction(conn, immediate=True):
+            cursor = conn.execute(
                 "UPDATE analytics_config SET config_value = ?, updated_at = CURRENT_TIMESTAMP WHERE config_key = ?",
                 (value, key)
             )
-            conn.commit()
-            return conn.total_changes > 0
-        finally:
-            conn.close()
+            updated = cursor.rowcount > 0
+            if updated:
+                self._rebuild_rankings(conn)
+        if updated:
+            self.invalidate_rankings()
+        return updated
     
-    def get_suspect_rankings(self) -> List[Dict[str, Any]]:
-        """
-        Calculate and return suspect rankings with full score breakdown.
-        Uses configurable weights from analytics_config table.
-        """
-        conn = self._get_connection()
-        try:
-            # Complex CTE query for suspect scoring
-            query = """
-            WITH config AS (
-                SELECT 
-                    MAX(CASE WHEN config_key = 'weight_criminal_record' THEN config_value END) AS w_criminal,
-                    MAX(CASE WHEN config_key = 'weight_crime_calls' THEN config_value END) AS w_calls,
-                    MAX(CASE WHEN config_key = 'weight_high_transactions' THEN config_value END) AS w_trans,
-                    MAX(CASE WHEN config_key = 'weight_bank_cctv' THEN config_value END) AS w_cctv,
-                    MAX(CASE WHEN config_key = 'weight_call_volume' THEN config_value END) AS w_volume,
-                    MAX(CASE WHEN config_key = 'high_transaction_threshold' THEN config_value END) AS trans_threshold,
-                    MAX(CASE WHEN config_key = 'crime_window_hours_before' THEN config_value END) AS window_before,
-                    MAX(CASE WHEN config_key = 'crime_window_hours_after' THEN config_value END) AS window_after
-                FROM analytics_config
-            ),
-            crime_info AS (
-                SELECT 
-                    cs.date_time as crime_time,
-                    cs.location_id as crime_location
-                FROM crime_scenes cs 
-                WHERE cs.case_number = 'CS-2024-001' 
-                LIMIT 1
-            ),
-            -- Score for criminal record
-            criminal_score AS (
-                SELECT 
-                    id,
-                    CASE WHEN criminal_record = 1 THEN (SELECT w_criminal FROM config) ELSE 0 END AS score
-                FROM suspects
-            ),
-            -- Score for calls during crime window
-            call_score AS (
-                SELECT 
-                    caller_id AS id,
-                    COUNT(*) * (SELECT w_calls FROM config) AS score,
-                    COUNT(*) AS call_count
-                FROM phone_records p, crime_info ci, config
-                WHERE p.timestamp BETWEEN 
-                    datetime(ci.crime_time, '-' || config.window_before || ' hours') AND
-                    datetime(ci.crime_time, '+' || config.window_after || ' hours')
-                GROUP BY caller_id
-            ),
-            -- Score for high-value transactions
-            transaction_score AS (
-                SELECT 
-                    account_id AS id,
-                    COUNT(*) * (SELECT w_trans FROM config) AS score,
-                    COUNT(*) AS trans_count,
-                    SUM(amount) AS total_amount
-                FROM bank_transactions, config
-                WHERE amount > config.trans_threshold
-                GROUP BY account_id
-            ),
-            -- Score for CCTV at crime location
-            cctv_score AS (
-                SELECT 
-                    c.person_id AS id,
-                    COUNT(*) * (SELECT w_cctv FROM config) AS score,
-                    COUNT(*) AS sighting_count
-                FROM cctv_logs c
-                JOIN crime_info ci ON c.location_id = ci.crime_location
-                GROUP BY c.person_id
-            ),
-            -- Total call volume (above average gets points)
-            call_volume AS (
-                SELECT 
-                    caller_id AS id,
-                    COUNT(*) AS total_calls,
-                    CASE 
-                        WHEN COUNT(*) > (SELECT AVG(cnt) FROM (SELECT COUNT(*) as cnt FROM phone_records GROUP BY caller_id))
-                        THEN (SELECT w_volume FROM config)
-                        ELSE 0
-                    END AS score
+    def invalidate_rankings(self):
+        """
+        Drop the memoized rankings so the next call recomputes them.
+        Bumping the version also discards a load that raced the rebuild.
+        """
+        with self._rankings_lock:
+            self._rankings_version += 1
+            self._rankings_cache = None
+    
+    def _cached_rankings(self) -> Tuple[tuple, Optional[tuple]]:
+        """
+        Return the current rankings version and, if the memo matches it,
+        the memoized (rankings, position_by_id) pair.
+        """
+        with self._get_connection() as conn:
+            stamp = tuple(conn.execute(_SQL_CONFIG_STAMP).fetchone())
+        with self._rankings_lock:
+            version = (self._rankings_version, stamp)
+            if self._rankings_cache is not None and self._rankings_cache[0] == version:
+                return version, self._rankings_cache[1:]
+            return version, None
+    
+    def get_suspect_rankings(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Return suspect rankings with full score breakdown, optionally only
+        the first `limit`. Full rankings are memoized until they are next
+        rebuilt or the config changes; a limited read without a memo
+        fetches just those rows.
+        """
+        version, cached = self._cached_rankings()
+        if cached is not None:
+            rankings = cached[0]
+            return rankings if limit is None else rankings[:limit]
+        
+        if limit is not None and limit >= 0:
+            return self._load_suspect_rankings(limit)
+        
+        rankings = self._load_suspect_rankings()
+        positions = {suspect['id']: i for i, suspect in enumerate(rankings)}
+        with self._rankings_lock:
+            if version[0] == self._rankings_version:
+                self._rankings_cache = (version, rankings, positions)
+        return rankings if limit is None else rankings[:limit]
+    
+    def refresh_rankings(self):
+        """
+        Recompute suspect_rankings_mv in one transaction.
+        Called at startup and whenever the scoring config changes.
+        """
+        with self._get_write_connection() as conn, transaction(conn, immediate=True):
+            self._rebuild_rankings(conn)
+        self.invalidate_rankings()
+    
+    def _rebuild_rankings(self, conn: sqlite3.Connection):
+        """Replace suspect_rankings_mv inside the caller's write transaction"""
+        rows = self._compute_suspect_scores(conn)
+        conn.execute("DELETE FROM suspect_rankings_mv")
+        conn.executemany(_SQL_INSERT_RANKING, rows)
+    
+    def _compute_suspect_scores(self, conn: sqlite3.Connection) -> List[tuple]:
+        """
+        Score every suspect using configurable weights from analytics_config.
+        Each signal is one indexed GROUP BY query; weights are applied here.
+        """
+        cfg = dict(conn.execute("SELECT config_key, config_value FROM analytics_config"))
+        w_criminal = cfg.get('weight_criminal_record') or 0
+        w_calls = cfg.get('weight_crime_calls') or 0
+        w_trans = cfg.get('weight_high_transactions') or 0
+        w_cctv = cfg.get('weight_bank_cctv') or 0
+        w_volume = cfg.get('weight_call_volume') or 0
+        window_before = cfg.get('crime_window_hours_before')
+        window_after = cfg.get('crime_window_hours_after')
+        
+        crime = conn.execute("""
+            SELECT date_time, location_id
+            FROM crime_scenes
+            WHERE case_number = 'CS-2024-001'
+            LIMIT 1
+        """).fetchone()
+        
+        # Calls during the crime window
+        crime_calls = {}
+        if crime and window_before is not None and window_after is not None:
+            crime_time = datetime.fromisoformat(crime['date_time'])
+            window_start = crime_time - timedelta(hours=window_before)
+            window_end = crime_time + timedelta(hours=window_after)
+            crime_calls = dict(conn.execute("""
+                SELECT caller_id, COUNT(*)
                 FROM phone_records
+                WHERE timestamp BETWEEN ? AND ?
                 GROUP BY caller_id
-            )
-            SELECT 
-                s.id,
-                s.name,
-                s.age,
-                s.occupation,
-                s.criminal_record,
-                COALESCE(cr.score, 0) AS criminal_score,
-                COALESCE(ca.score, 0) AS crime_window_call_score,
-                COALESCE(ca.call_count, 0) AS crime_window_calls,
-                COALESCE(tr.score, 0) AS high_transaction_score,
-                COALESCE(tr.trans_count, 0) AS high_transactions,
-                COALESCE(tr.total_amount, 0) AS high_transaction_total,
-                COALESCE(cc.score, 0) AS cctv_score,
-                COALESCE(cc.sighting_count, 0) AS bank_sightings,
-                COALESCE(cv.score, 0) AS volume_score,
-                COALESCE(cv.total_calls, 0) AS total_calls,
-                ROUND(
-                    COALESCE(cr.score, 0) + 
-                    COALESCE(ca.score, 0) + 
-                    COALESCE(tr.score, 0) + 
-                    COALESCE(cc.score, 0) + 
-                    COALESCE(cv.score, 0),
-                    1
-                ) AS total_score
-            FROM suspects s
-            LEFT JOIN criminal_score cr ON s.id = cr.id
-            LEFT JOIN call_score ca ON s.id = ca.id
-            LEFT JOIN transaction_score tr ON s.id = tr.id
-            LEFT JOIN cctv_score cc ON s.id = cc.id
-            LEFT JOIN call_volume cv ON s.id = cv.id
-            ORDER BY total_score DESC;
-            """
+            """, (window_start.strftime(_TIMESTAMP_FORMAT), window_end.strftime(_TIMESTAMP_FORMAT))).fetchall())
+        
+        # High-value transactions
+        high_transactions = {row[0]: (row[1], row[2]) for row in conn.execute("""
+            SELECT account_id, COUNT(*), SUM(amount)
+            FROM bank_transactions
+            WHERE amount > ?
+            GROUP BY account_id
+        """, (cfg.get('high_transaction_threshold'),))}
+        
+        # CCTV sightings at the crime location
+        sightings = {}
+        if crime:
+            sightings = dict(conn.execute("""
+                SELECT person_id, COUNT(*)
+                FROM cctv_logs
+                WHERE location_id = ?
+                GROUP BY person_id
+            """, (crime['location_id'],)).fetchall())
+        
+        # Total call volume (above average gets points)
+        call_volume = dict(conn.execute("""
+            SELECT caller_id, COUNT(*)
+            FROM phone_records
+            GROUP BY caller_id
+        """).fetchall())
+        average_calls = sum(call_volume.values()) / len(call_volume) if call_volume else 0
+        
+        rows = []
+        for suspect_id, name, age, occupation, criminal_record in conn.execute(
+            "SELECT id, name, age, occupation, criminal_record FROM suspects"
+        ):
+            call_count = crime_calls.get(suspect_id, 0)
+            trans_count, trans_total = high_transactions.get(suspect_id, (0, 0))
+            sighting_count = sightings.get(suspect_id, 0)
+            total_calls = call_volume.get(suspect_id, 0)
             
-            cursor = conn.execute(query)
-            results = []
-            for row in cursor.fetchall():
-                results.append({
-                    'id': row['id'],
-                    'name': row['name'],
-                    'age': row['age'],
-                    'occupation': row['occupation'],
-                    'criminal_record': bool(row['criminal_record']),
-                    'scores': {
-                        'criminal': row['criminal_score'],
-                        'crime_calls': row['crime_window_call_score'],
-                        'transactions': row['high_transaction_score'],
-                        'cctv': row['cctv_score'],
-                        'volume': row['volume_score']
-                    },
-                    'details': {
-                        'crime_window_calls': row['crime_window_calls'],
-                        'high_transactions': row['high_transactions'],
-                        'high_transaction_total': row['high_transaction_total'],
-                        'bank_sightings': row['bank_sightings'],
-                        'total_calls': row['total_calls']
-                    },
-                    'total_score': row['total_score'],
-                    'rank': len(results) + 1
-                })
+            criminal_score = w_criminal if criminal_record == 1 else 0
+            call_score = call_count * w_calls
+            trans_score = trans_count * w_trans
+            cctv_score = sighting_count * w_cctv
+            volume_score = w_volume if total_calls > average_calls else 0
             
-            return results
-        finally:
-            conn.close()
+            rows.append((
+                suspect_id, name, age, occupation, criminal_record,
+                criminal_score, call_score, call_count,
+                trans_score, trans_count, trans_total,
+                cctv_score, sighting_count, volume_score, total_calls,
+                criminal_score + call_score + trans_score + cctv_score + volume_score
+            ))
+        return rows
+    
+    def _load_suspect_rankings(self, limit: int = -1) -> List[Dict[str, Any]]:
+        """Read the top `limit` suspect rankings (-1 for all) from the materialized table"""
+        with self._get_connection() as conn:
+            cursor = conn.execute(
+                f"SELECT {_RANKING_COLUMNS} FROM suspect_rankings_mv "
+                "ORDER BY total_score DESC, id LIMIT ?",
+                (limit,)
+            )
+            return [_ranking_from_row(row, rank) for rank, row in enumerate(cursor, start=1)]
     
     def get_suspect_detail(self, suspect_id: int) -> Optional[Dict[str, Any]]:
-        """Get detailed analytics for a single suspect"""
-        rankings = self.get_suspect_rankings()
-        for suspect in rankings:
-            if suspect['id'] == suspect_id:
-                return suspect
-        return None
+        """
+        Get detailed analytics for a single suspect.
+        Served from the memoized rankings when current, otherwise one row
+        plus its rank are read from the materialized table.
+        """
+        _, cached = self._cached_rankings()
+        if cached is not None:
+            rankings, positions = cached
+            position = positions.get(suspect_id)
+            return rankings[position] if position is not None else None
+        
+        with self._get_connection() as conn:
+            row = conn.execute(
+                f"SELECT {_RANKING_COLUMNS} FROM suspect_rankings_mv WHERE id = ?", (suspect_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            # Rows ahead of this one in ORDER BY total_score DESC, id
+            rank = conn.execute("""
+                SELECT 1 + COUNT(*) FROM suspect_rankings_mv
+                WHERE total_score > :score OR (total_score = :score AND id < :id)
+            """, {'score': row[-1], 'id': suspect_id}).fetchone()[0]
+            return _ranking_from_row(row, rank)
     
     def get_score_breakdown_chart_data(self) -> Dict[str, Any]:
-        """Get data formatted for chart visualization"""
+        """
+        Get data formatted for chart visualization.
+        The series are built in one pass and reused while rankings are unchanged.
+        """
         rankings = self.get_suspect_rankings()
+        cached = self._chart_cache
+        if cached is not None and cached[0] is rankings:
+            return cached[1]
         
-        return {
-            'labels': [s['name'] for s in rankings],
+        labels, totals = [], []
+        criminal, crime_calls, transactions, cctv, volume = [], [], [], [], []
+        for suspect in rankings:
+            scores = suspect['scores']
+            labels.append(suspect['name'])
+            criminal.append(scores['criminal'])
+            crime_calls.append(scores['crime_calls'])
+            transactions.append(scores['transactions'])
+            cctv.append(scores['cctv'])
+            volume.append(scores['volume'])
+            totals.append(suspect['total_score'])
+        
+        chart = {
+            'labels': labels,
             'datasets': [
                 {
                     'label': 'Criminal Record',
-                    'data': [s['scores']['criminal'] for s in rankings],
+                    'data': criminal,
                     'backgroundColor': 'rgba(255, 99, 132, 0.7)'
                 },
                 {
                     'label': 'Crime Window Calls',
-                    'data': [s['scores']['crime_calls'] for s in rankings],
+                    'data': crime_calls,
                     'backgroundColor': 'rgba(54, 162, 235, 0.7)'
                 },
                 {
                     'label': 'High Transactions',
-                    'data': [s['scores']['transactions'] for s in rankings],
+                    'data': transactions,
                     'backgroundColor': 'rgba(255, 206, 86, 0.7)'
                 },
                 {
                     'label': 'CCTV at Bank',
-                    'data': [s['scores']['cctv'] for s in rankings],
+                    'data': cctv,
                     'backgroundColor': 'rgba(75, 192, 192, 0.7)'
                 },
                 {
                     'label': 'Call Volume',
-                    'data': [s['scores']['volume'] for s in rankings],
+                    'data': volume,
                     'backgroundColor': 'rgba(153, 102, 255, 0.7)'
                 }
             ],
-            'total_scores': [s['total_score'] for s in rankings]
+            'total_scores': totals
         }
+        self._chart_cache = (rankings, chart)
+        return chart
     
     def get_top_suspects(self, limit: int = 3) -> List[Dict[str, Any]]:
         """Get top N suspects by score"""
-        rankings = self.get_suspect_rankings()
-        return rankings[:limit]
+        return self.get_suspect_rankings(limit)
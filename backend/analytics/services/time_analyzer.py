@@ -3,9 +3,45 @@ Time-Based Behavioral Analysis Module
 Analyzes how suspect behavior changes over time and identifies abnormal patterns
 """
 
+import heapq
 import sqlite3
-from typing import List, Dict, Any
-from datetime import datetime
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Any, Tuple
+from datetime import datetime, timedelta
+
+from .connections import ThreadLocalConnections
+
+
+# Reference point and span for the before/after crime comparison
+_CRIME_REFERENCE = '2024-03-15 23:30:00'
+_COMPARISON_WINDOW_HOURS = 24
+
+_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _day_bounds(date: str) -> Tuple[str, str]:
+    """
+    Timestamp range [start, end) covering one 'YYYY-MM-DD' day, so filters
+    can use the timestamp indexes. Invalid dates give an empty range.
+    """
+    try:
+        day = datetime.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        return date, date
+    if day.strftime('%Y-%m-%d') != date:
+        return date, date
+    return date, (day + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def _classify_change(before: int, after: int) -> str:
+    """Label how activity changed across the crime"""
+    if before == 0 and after > 0:
+        return 'NEW_ACTIVITY'
+    if after > before * 2:
+        return 'SPIKE'
+    if after < before * 0.5:
+        return 'DROP'
+    return 'NORMAL'
 
 
 class TimeAnalyzer:
@@ -19,95 +55,74 @@ class TimeAnalyzer:
     
     def __init__(self, db_path: str):
         self.db_path = db_path
+        self._connections = ThreadLocalConnections(db_path)
+        self._locations = None
+        self._suspects = None
+    
+    @contextmanager
+    def _get_connection(self) -> Iterator[sqlite3.Connection]:
+        """Yield this thread's cached read-only connection (all queries here are reads)"""
+        yield self._connections.get_read_only()
+    
+    def _location_names(self, conn: sqlite3.Connection) -> Dict[int, str]:
+        """Location names by id, loaded once (the case data is read-only)"""
+        if self._locations is None:
+            self._locations = dict(conn.execute("SELECT id, name FROM locations").fetchall())
+        return self._locations
     
-    def _get_connection(self) -> sqlite3.Connection:
-        """Get database connection with row factory"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    def _suspect_names(self, conn: sqlite3.Connection) -> Dict[int, str]:
+        """Suspect names keyed and ordered by id, loaded once"""
+        if self._suspects is None:
+            self._suspects = dict(conn.execute("SELECT id, name FROM suspects ORDER BY id").fetchall())
+        return self._suspects
     
     def get_hourly_activity(self, date: str = '2024-03-15') -> Dict[str, Any]:
         """
         Get hourly activity breakdown for a given date.
         Returns phone calls, transactions, and CCTV sightings per hour.
         """
-        conn = self._get_connection()
-        try:
-            query = """
-            WITH RECURSIVE hours(n) AS (
-                SELECT 0
-                UNION ALL
-                SELECT n + 1 FROM hours WHERE n < 23
-            ),
-            hour_range AS (
-                SELECT 
-                    n AS hour_num,
-                    datetime(:date || ' ' || printf('%02d', n) || ':00:00') AS hour_start,
-                    datetime(:date || ' ' || printf('%02d', n) || ':59:59') AS hour_end
-                FROM hours
-            ),
-            phone_counts AS (
-                SELECT 
-                    CAST(strftime('%H', timestamp) AS INTEGER) AS hour_num,
-                    COUNT(*) AS count
-                FROM phone_records
-                WHERE DATE(timestamp) = :date
-                GROUP BY hour_num
-            ),
-            trans_counts AS (
-                SELECT 
-                    CAST(strftime('%H', timestamp) AS INTEGER) AS hour_num,
-                    COUNT(*) AS count,
-                    SUM(amount) AS volume
-                FROM bank_transactions
-                WHERE DATE(timestamp) = :date
-                GROUP BY hour_num
-            ),
-            cctv_counts AS (
-                SELECT 
-                    CAST(strftime('%H', timestamp) AS INTEGER) AS hour_num,
-                    COUNT(*) AS count
-                FROM cctv_logs
-                WHERE DATE(timestamp) = :date
-                GROUP BY hour_num
-            )
-            SELECT 
-                h.hour_num,
-                printf('%02d:00', h.hour_num) AS hour_label,
-                COALESCE(p.count, 0) AS phone_calls,
-                COALESCE(t.count, 0) AS transactions,
-                COALESCE(t.volume, 0) AS transaction_volume,
-                COALESCE(c.count, 0) AS cctv_sightings
-            FROM hour_range h
-            LEFT JOIN phone_counts p ON h.hour_num = p.hour_num
-            LEFT JOIN trans_counts t ON h.hour_num = t.hour_num
-            LEFT JOIN cctv_counts c ON h.hour_num = c.hour_num
-            ORDER BY h.hour_num;
-            """
+        day_range = _day_bounds(date)
+        with self._get_connection() as conn:
+            # Bucket raw timestamps by hour in Python ('YYYY-MM-DD HH:...')
+            phone_calls = [0] * 24
+            for (timestamp,) in conn.execute(
+                "SELECT timestamp FROM phone_records WHERE timestamp >= ? AND timestamp < ?", day_range
+            ):
+                phone_calls[int(timestamp[11:13])] += 1
+            
+            transactions = [0] * 24
+            transaction_volume = [0] * 24
+            for timestamp, amount in conn.execute(
+                "SELECT timestamp, amount FROM bank_transactions WHERE timestamp >= ? AND timestamp < ?",
+                day_range
+            ):
+                hour = int(timestamp[11:13])
+                transactions[hour] += 1
+                transaction_volume[hour] += amount
             
-            cursor = conn.execute(query, {'date': date})
-            rows = cursor.fetchall()
+            cctv_sightings = [0] * 24
+            for (timestamp,) in conn.execute(
+                "SELECT timestamp FROM cctv_logs WHERE timestamp >= ? AND timestamp < ?", day_range
+            ):
+                cctv_sightings[int(timestamp[11:13])] += 1
             
             return {
                 'date': date,
-                'labels': [row['hour_label'] for row in rows],
-                'phone_calls': [row['phone_calls'] for row in rows],
-                'transactions': [row['transactions'] for row in rows],
-                'transaction_volume': [row['transaction_volume'] for row in rows],
-                'cctv_sightings': [row['cctv_sightings'] for row in rows],
-                'total_calls': sum(row['phone_calls'] for row in rows),
-                'total_transactions': sum(row['transactions'] for row in rows),
-                'total_sightings': sum(row['cctv_sightings'] for row in rows)
+                'labels': [f'{hour:02d}:00' for hour in range(24)],
+                'phone_calls': phone_calls,
+                'transactions': transactions,
+                'transaction_volume': transaction_volume,
+                'cctv_sightings': cctv_sightings,
+                'total_calls': sum(phone_calls),
+                'total_transactions': sum(transactions),
+                'total_sightings': sum(cctv_sightings)
             }
-        finally:
-            conn.close()
     
     def get_suspect_timeline(self, suspect_id: int) -> Dict[str, Any]:
         """
         Get a complete timeline of activities for a specific suspect.
         """
-        conn = self._get_connection()
-        try:
+        with self._get_connection() as conn:
             # Get suspect info
             cursor = conn.execute(
                 "SELECT name, occupation FROM suspects WHERE id = ?",
@@ -117,55 +132,67 @@ class TimeAnalyzer:
             if not suspect:
                 return {'error': 'Suspect not found'}
             
-            # Get all activities merged into timeline
-            query = """
-            SELECT * FROM (
-                SELECT 
-                    'phone_call' AS activity_type,
-                    timestamp,
-                    'Called ID: ' || receiver_id || ' (' || duration || 's)' AS description
-                FROM phone_records
-                WHERE caller_id = :suspect_id
-                
-                UNION ALL
-                
-                SELECT 
-                    'phone_received' AS activity_type,
-                    timestamp,
-                    'Received from ID: ' || caller_id || ' (' || duration || 's)' AS description
-                FROM phone_records
-                WHERE receiver_id = :suspect_id
-                
-                UNION ALL
-                
-                SELECT 
-                    'transaction' AS activity_type,
-                    timestamp,
-                    transaction_type || ': $' || amount AS description
-                FROM bank_transactions
-                WHERE account_id = :suspect_id
-                
-                UNION ALL
-                
-                SELECT 
-                    'cctv' AS activity_type,
-                    c.timestamp,
-                    'Seen at ' || l.name || ' (' || c.confidence || '% confidence)' AS description
-                FROM cctv_logs c
-                JOIN locations l ON c.location_id = l.id
-                WHERE c.person_id = :suspect_id
+            # Each source is an indexed seek already ordered by timestamp,
+            # merged lazily. Descriptions stay NULL when a part is missing,
+            # as they were with SQL string concatenation.
+            calls_made = (
+                {
+                    'type': 'phone_call',
+                    'timestamp': timestamp,
+                    'description': (f'Called ID: {receiver_id} ({duration}s)'
+                                    if receiver_id is not None and duration is not None else None)
+                }
+                for timestamp, receiver_id, duration in conn.execute(
+                    "SELECT timestamp, receiver_id, duration FROM phone_records "
+                    "WHERE caller_id = ? ORDER BY timestamp",
+                    (suspect_id,)
+                )
+            )
+            calls_received = (
+                {
+                    'type': 'phone_received',
+                    'timestamp': timestamp,
+                    'description': (f'Received from ID: {caller_id} ({duration}s)'
+                                    if duration is not None else None)
+                }
+                for timestamp, caller_id, duration in conn.execute(
+                    "SELECT timestamp, caller_id, duration FROM phone_records "
+                    "WHERE receiver_id = ? ORDER BY timestamp",
+                    (suspect_id,)
+                )
+            )
+            transactions = (
+                {
+                    'type': 'transaction',
+                    'timestamp': timestamp,
+                    'description': f'{transaction_type}: ${amount}'
+                }
+                for timestamp, transaction_type, amount in conn.execute(
+                    "SELECT timestamp, transaction_type, amount FROM bank_transactions "
+                    "WHERE account_id = ? ORDER BY timestamp",
+                    (suspect_id,)
+                )
+            )
+            locations = self._location_names(conn)
+            sightings = (
+                {
+                    'type': 'cctv',
+                    'timestamp': timestamp,
+                    'description': (f'Seen at {locations[location_id]} ({confidence}% confidence)'
+                                    if confidence is not None else None)
+                }
+                for timestamp, location_id, confidence in conn.execute(
+                    "SELECT timestamp, location_id, confidence_score FROM cctv_logs "
+                    "WHERE person_id = ? ORDER BY timestamp",
+                    (suspect_id,)
+                )
+                if location_id in locations
             )
-            ORDER BY timestamp;
-            """
             
-            cursor = conn.execute(query, {'suspect_id': suspect_id})
-            activities = []
-            for row in cursor.fetchall():
-                activities.append({
-                    'type': row['activity_type'],
-                    'timestamp': row['timestamp'],
-                    'description': row['description']
-                })
+            activities = list(heapq.merge(
+                calls_made, calls_received, transactions, sightings,
+                key=lambda activity: activity['timestamp']
+            ))
             
             return {
                 'suspect_id': suspect_id,
@@ -174,156 +201,120 @@ class TimeAnalyzer:
                 'activities': activities,
                 'total_activities': len(activities)
             }
-        finally:
-            conn.close()
     
     def get_before_after_comparison(self) -> Dict[str, Any]:
         """
         Compare suspect activity before and after the crime.
         Identifies spikes, drops, and new activity patterns.
         """
-        conn = self._get_connection()
-        try:
+        with self._get_connection() as conn:
+            # Window bounds are bound as literals so the timestamp indexes apply
+            crime_time = datetime.strptime(_CRIME_REFERENCE, _TIMESTAMP_FORMAT)
+            window = timedelta(hours=_COMPARISON_WINDOW_HOURS)
+            bounds = {
+                'window_start': (crime_time - window).strftime(_TIMESTAMP_FORMAT),
+                'crime_dt': _CRIME_REFERENCE,
+                'window_end': (crime_time + window).strftime(_TIMESTAMP_FORMAT)
+            }
             query = """
-            WITH crime_time AS (
-                SELECT datetime('2024-03-15 23:30:00') AS crime_dt
-            ),
-            -- Phone activity before crime (24 hours)
-            calls_before AS (
-                SELECT 
-                    caller_id AS suspect_id,
-                    COUNT(*) AS count
-                FROM phone_records, crime_time
-                WHERE timestamp BETWEEN 
-                    datetime(crime_time.crime_dt, '-24 hours') AND crime_time.crime_dt
-                GROUP BY caller_id
-            ),
-            -- Phone activity after crime (24 hours)
-            calls_after AS (
+            WITH
+            -- Phone activity before/after the crime, one pass over both
+            -- windows (a call exactly at the crime time counts in each)
+            calls AS (
                 SELECT 
                     caller_id AS suspect_id,
-                    COUNT(*) AS count
-                FROM phone_records, crime_time
-                WHERE timestamp BETWEEN 
-                    crime_time.crime_dt AND datetime(crime_time.crime_dt, '+24 hours')
+                    SUM(timestamp <= :crime_dt) AS before_count,
+                    SUM(timestamp >= :crime_dt) AS after_count
+                FROM phone_records
+                WHERE timestamp BETWEEN :window_start AND :window_end
                 GROUP BY caller_id
             ),
-            -- Transactions before
-            trans_before AS (
-                SELECT 
-                    account_id AS suspect_id,
-                    COUNT(*) AS count,
-                    SUM(amount) AS total
-                FROM bank_transactions, crime_time
-                WHERE timestamp BETWEEN 
-                    datetime(crime_time.crime_dt, '-24 hours') AND crime_time.crime_dt
-                GROUP BY account_id
-            ),
-            -- Transactions after
-            trans_after AS (
+            -- Transactions before/after, same windows
+            trans AS (
                 SELECT 
                     account_id AS suspect_id,
-                    COUNT(*) AS count,
-                    SUM(amount) AS total
-                FROM bank_transactions, crime_time
-                WHERE timestamp BETWEEN 
-                    crime_time.crime_dt AND datetime(crime_time.crime_dt, '+24 hours')
+                    SUM(timestamp <= :crime_dt) AS before_count,
+                    SUM(timestamp >= :crime_dt) AS after_count
+                FROM bank_transactions
+                WHERE timestamp BETWEEN :window_start AND :window_end
                 GROUP BY account_id
             )
             SELECT 
                 s.id,
                 s.name,
-                COALESCE(cb.count, 0) AS calls_before,
-                COALESCE(ca.count, 0) AS calls_after,
-                COALESCE(ca.count, 0) - COALESCE(cb.count, 0) AS call_change,
-                COALESCE(tb.count, 0) AS trans_before,
-                COALESCE(ta.count, 0) AS trans_after,
-                COALESCE(ta.count, 0) - COALESCE(tb.count, 0) AS trans_change,
-                CASE 
-                    WHEN COALESCE(cb.count, 0) = 0 AND COALESCE(ca.count, 0) > 0 THEN 'NEW_ACTIVITY'
-                    WHEN COALESCE(ca.count, 0) > COALESCE(cb.count, 0) * 2 THEN 'SPIKE'
-                    WHEN COALESCE(ca.count, 0) < COALESCE(cb.count, 0) * 0.5 THEN 'DROP'
-                    ELSE 'NORMAL'
-                END AS call_pattern,
-                CASE 
-                    WHEN COALESCE(tb.count, 0) = 0 AND COALESCE(ta.count, 0) > 0 THEN 'NEW_ACTIVITY'
-                    WHEN COALESCE(ta.count, 0) > COALESCE(tb.count, 0) * 2 THEN 'SPIKE'
-                    WHEN COALESCE(ta.count, 0) < COALESCE(tb.count, 0) * 0.5 THEN 'DROP'
-                    ELSE 'NORMAL'
-                END AS trans_pattern
+                COALESCE(c.before_count, 0) AS calls_before,
+                COALESCE(c.after_count, 0) AS calls_after,
+                COALESCE(t.before_count, 0) AS trans_before,
+                COALESCE(t.after_count, 0) AS trans_after
             FROM suspects s
-            LEFT JOIN calls_before cb ON s.id = cb.suspect_id
-            LEFT JOIN calls_after ca ON s.id = ca.suspect_id
-            LEFT JOIN trans_before tb ON s.id = tb.suspect_id
-            LEFT JOIN trans_after ta ON s.id = ta.suspect_id
-            ORDER BY ABS(COALESCE(ca.count, 0) - COALESCE(cb.count, 0)) DESC;
+            LEFT JOIN calls c ON s.id = c.suspect_id
+            LEFT JOIN trans t ON s.id = t.suspect_id
+            ORDER BY ABS(COALESCE(c.after_count, 0) - COALESCE(c.before_count, 0)) DESC;
             """
             
-            cursor = conn.execute(query)
+            cursor = conn.execute(query, bounds)
             results = []
-            for row in cursor.fetchall():
+            for suspect_id, name, calls_before, calls_after, trans_before, trans_after in cursor:
                 results.append({
-                    'id': row['id'],
-                    'name': row['name'],
+                    'id': suspect_id,
+                    'name': name,
                     'calls': {
-                        'before': row['calls_before'],
-                        'after': row['calls_after'],
-                        'change': row['call_change'],
-                        'pattern': row['call_pattern']
+                        'before': calls_before,
+                        'after': calls_after,
+                        'change': calls_after - calls_before,
+                        'pattern': _classify_change(calls_before, calls_after)
                     },
                     'transactions': {
-                        'before': row['trans_before'],
-                        'after': row['trans_after'],
-                        'change': row['trans_change'],
-                        'pattern': row['trans_pattern']
+                        'before': trans_before,
+                        'after': trans_after,
+                        'change': trans_after - trans_before,
+                        'pattern': _classify_change(trans_before, trans_after)
                     }
                 })
             
             return {
-                'crime_reference': '2024-03-15 23:30:00',
-                'window': '24 hours',
+                'crime_reference': _CRIME_REFERENCE,
+                'window': f'{_COMPARISON_WINDOW_HOURS} hours',
                 'suspects': results,
                 'anomalies': [s for s in results if s['calls']['pattern'] != 'NORMAL' or s['transactions']['pattern'] != 'NORMAL']
             }
-        finally:
-            conn.close()
     
     def get_activity_heatmap_data(self) -> Dict[str, Any]:
         """
         Get data for activity heatmap visualization.
         Shows activity intensity by suspect and hour.
         """
-        conn = self._get_connection()
-        try:
-            query = """
-            SELECT 
-                s.id AS suspect_id,
-                s.name,
-                CAST(strftime('%H', p.timestamp) AS INTEGER) AS hour,
-                COUNT(*) AS activity_count
-            FROM suspects s
-            JOIN phone_records p ON s.id = p.caller_id
-            WHERE DATE(p.timestamp) = '2024-03-15'
-            GROUP BY s.id, hour
-            ORDER BY s.id, hour;
-            """
+        with self._get_connection() as conn:
+            suspect_names = self._suspect_names(conn)
+            cursor = conn.execute("""
+                SELECT 
+                    caller_id,
+                    CAST(strftime('%H', timestamp) AS INTEGER) AS hour,
+                    COUNT(*) AS activity_count
+                FROM phone_records
+                WHERE timestamp >= ? AND timestamp < ?
+                GROUP BY caller_id, hour;
+            """, _day_bounds('2024-03-15'))
             
-            cursor = conn.execute(query)
-            rows = cursor.fetchall()
+            # Fill a dense suspect x hour matrix in one pass over the counts
+            row_of = {suspect_id: i for i, suspect_id in enumerate(suspect_names)}
+            matrix = [None] * len(row_of)
+            for caller_id, hour, activity_count in cursor:
+                i = row_of.get(caller_id)
+                if i is None:
+                    continue
+                if matrix[i] is None:
+                    matrix[i] = [0] * 24
+                matrix[i][hour] = activity_count
             
-            # Build heatmap matrix
-            suspects = {}
-            for row in rows:
-                if row['suspect_id'] not in suspects:
-                    suspects[row['suspect_id']] = {
-                        'name': row['name'],
-                        'hours': [0] * 24
-                    }
-                suspects[row['suspect_id']]['hours'][row['hour']] = row['activity_count']
+            # Suspects without calls that day are left out, ordered by id
+            suspects = [
+                {'name': name, 'hours': hours}
+                for name, hours in zip(suspect_names.values(), matrix)
+                if hours is not None
+            ]
             
             return {
-                'suspects': list(suspects.values()),
+                'suspects': suspects,
                 'hours': [f'{h:02d}:00' for h in range(24)]
             }
-        finally:
-            conn.close()
@@ -11,10 +11,18 @@ import sqlite3
 from flask import Flask, send_from_directory, session
 from flask_cors import CORS
 
+# Response compression is optional; the app works without it
+try:
+    from flask_compress import Compress
+    COMPRESS_ENABLED = True
+except ImportError:
+    COMPRESS_ENABLED = False
+
 from config import Config
 from routes.game import game_bp
 from routes.query import query_bp
 from analytics.routes import analytics_bp
+from analytics.services import SuspectScorer, TimeAnalyzer, PlayerAnalytics
 
 
 def create_app(config_class=Config):
@@ -29,12 +37,24 @@ def create_app(config_class=Config):
     # Enable CORS for development
     CORS(app, supports_credentials=True)
     
+    # Gzip/brotli JSON payloads for clients that accept it
+    if COMPRESS_ENABLED:
+        Compress(app)
+    
     # Initialize database if needed
     init_database(app)
     
     # Initialize analytics tables
     init_analytics(app)
     
+    # Share analytics services across requests
+    db_path = app.config['DATABASE_PATH']
+    app.extensions['analytics'] = {
+        'scorer': SuspectScorer(db_path),
+        'time': TimeAnalyzer(db_path),
+        'players': PlayerAnalytics(db_path)
+    }
+    
     # Register blueprints
     app.register_blueprint(game_bp)
     app.register_blueprint(query_bp)
@@ -50,9 +70,17 @@ def create_app(config_class=Config):
     def serve_analytics():
         return send_from_directory(app.static_folder, 'analytics/analytics.html')
     
+    # Frontend files are fixed at startup, so existence is a set lookup;
+    # in debug mode the disk is checked so edited files show up
+    static_files = collect_static_files(app.static_folder)
+    
     @app.route('/<path:path>')
     def serve_static(path):
-        if os.path.exists(os.path.join(app.static_folder, path)):
+        if app.debug:
+            exists = os.path.exists(os.path.join(app.static_folder, path))
+        else:
+            exists = path in static_files
+        if exists:
             return send_from_directory(app.static_folder, path)
         return send_from_directory(app.static_folder, 'index.html')
     
@@ -64,6 +92,31 @@ def create_app(config_class=Config):
     return app
 
 
+def collect_static_files(folder):
+    """Relative paths (with '/' separators) of every file under folder"""
+    files = set()
+    for root, _, names in os.walk(folder):
+        for name in names:
+            relative = os.path.relpath(os.path.join(root, name), folder)
+            files.add(relative.replace(os.sep, '/'))
+    return frozenset(files)
+
+
+# Wrap bulk schema/seed loading: one transaction, no fsyncs, no FK checks
+_BULK_LOAD_START = """
+PRAGMA journal_mode=MEMORY;
+PRAGMA synchronous=OFF;
+PRAGMA foreign_keys=OFF;
+BEGIN;
+"""
+
+_BULK_LOAD_END = """
+COMMIT;
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+"""
+
+
 def init_database(app):
     """Initialize the database with schema and seed data if it doesn't exist"""
     db_path = app.config['DATABASE_PATH']
@@ -86,28 +139,35 @@ def init_database(app):
     
     print("Initializing database...")
     
-    # Create and populate database
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    # Create and populate database. Schema and seed data run as a single
+    # script in one transaction with syncing off, since a failed load is
+    # simply redone on the next start.
+    script = [_BULK_LOAD_START]
     
     # Execute schema
-    if os.path.exists(schema_path):
+    has_schema = os.path.exists(schema_path)
+    if has_schema:
         with open(schema_path, 'r') as f:
-            cursor.executescript(f.read())
-        print("✓ Schema created")
+            script.append(f.read())
     else:
         print("✗ Schema file not found!")
     
     # Execute seed data
-    if os.path.exists(seed_path):
+    has_seed = os.path.exists(seed_path)
+    if has_seed:
         with open(seed_path, 'r') as f:
-            cursor.executescript(f.read())
-        print("✓ Seed data inserted")
+            script.append(f.read())
     else:
         print("✗ Seed data file not found!")
     
-    conn.commit()
+    script.append(_BULK_LOAD_END)
+    conn = sqlite3.connect(db_path)
+    conn.executescript('\n'.join(script))
     conn.close()
+    if has_schema:
+        print("✓ Schema created")
+    if has_seed:
+        print("✓ Seed data inserted")
     print("✓ Database initialization complete")
 
 
@@ -122,28 +182,43 @@ def init_analytics(app):
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='analytics_config'")
-    if cursor.fetchone():
-        conn.close()
+    initialized = cursor.fetchone() is not None
+    
+    if initialized:
         print("✓ Analytics tables already initialized")
-        return
+    else:
+        print("Initializing analytics tables...")
     
-    print("Initializing analytics tables...")
+    # WAL mode is persistent, so switching the file over here covers every
+    # later connection, including the read-only ones that can't set it.
+    # The rest runs as one script inside a single transaction.
+    script = ["PRAGMA journal_mode=WAL;\nPRAGMA synchronous=OFF;\nBEGIN;"]
     
-    # Create analytics schema
-    if os.path.exists(schema_path):
+    # Create analytics schema. Every statement is idempotent, so this also
+    # brings databases created by older versions up to date.
+    has_schema = os.path.exists(schema_path)
+    if has_schema:
         with open(schema_path, 'r') as f:
-            cursor.executescript(f.read())
-        print("✓ Analytics schema created")
+            script.append(f.read())
     
-    # Insert default config
-    if os.path.exists(config_path):
+    # Insert default config only once, so tuned weights survive restarts
+    load_config = not initialized and os.path.exists(config_path)
+    if load_config:
         with open(config_path, 'r') as f:
-            cursor.executescript(f.read())
-        print("✓ Analytics config loaded")
+            script.append(f.read())
     
-    conn.commit()
+    script.append("COMMIT;")
+    cursor.executescript('\n'.join(script))
     conn.close()
-    print("✓ Analytics initialization complete")
+    if has_schema and not initialized:
+        print("✓ Analytics schema created")
+    if load_config:
+        print("✓ Analytics config loaded")
+    
+    # Materialize suspect rankings for the current data and weights
+    SuspectScorer(db_path).refresh_rankings()
+    if not initialized:
+        print("✓ Analytics initialization complete")
 
 
 # Create the application
@@ -16,6 +16,9 @@ class Config:
     """Base configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY', 'sql-detective-secret-key-2024')
     
+    # Only send the session cookie back when a request changed it
+    SESSION_REFRESH_EACH_REQUEST = False
+    
     # Database settings
     BASE_DIR = BASE_DIR
     DATABASE_PATH = DATABASE_PATH
@@ -32,6 +35,21 @@ class Config:
         'REINDEX', 'REPLACE', 'UPSERT'
     ]
     
+    # Tables player queries may not read: derived analytics that would
+    # hand players the answer to the case
+    HIDDEN_TABLES = ['suspect_rankings_mv']
+    
+    # Response compression settings (used when flask-compress is installed)
+    COMPRESS_MIMETYPES = ['application/json']
+    COMPRESS_LEVEL = 6
+    COMPRESS_MIN_SIZE = 512
+    
+    # Keep player progress in process memory instead of the session cookie
+    # (single-process deployments only; see services/progress.py)
+    PROGRESS_IN_PROCESS = os.environ.get('PROGRESS_IN_PROCESS', '0') == '1'
+    # Most players kept in process; the least recently used are dropped past this
+    PROGRESS_IN_PROCESS_MAX_PLAYERS = int(os.environ.get('PROGRESS_IN_PROCESS_MAX_PLAYERS', '10000'))
+    
     # CORS settings
     CORS_ORIGINS = ['http://localhost:5000', 'http://127.0.0.1:5000']
 
@@ -1,2 +1,2 @@
 """Levels package"""
-from levels.level_config import Level, get_level, get_all_levels, get_level_count, get_tables_for_level, LEVELS
+from levels.level_config import Level, get_level, get_all_levels, get_level_count, get_tables_for_level, get_tables_set_for_level, LEVELS, LEVELS_BY_ID, LEVELS_LIST, LEVELS_PUBLIC, TOTAL_LEVELS
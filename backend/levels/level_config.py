@@ -2,12 +2,30 @@
 SQL Detective Game - Level Configuration
 Contains all 7 level definitions with stories, objectives, and expected queries
 """
-from typing import Dict, List, Any
+import sys
+import textwrap
+from typing import Dict, FrozenSet, List, Optional, Tuple, Any, Iterable
+
+# Canonical tuples, so levels with the same table list share one object
+_SHARED_TUPLES: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _shared_tuple(values: Iterable[str]) -> Tuple[str, ...]:
+    """Tuple of interned strings, reusing an equal tuple built earlier"""
+    values = tuple(sys.intern(value) for value in values)
+    return _SHARED_TUPLES.setdefault(values, values)
 
 
 class Level:
     """Represents a single level in the game"""
     
+    __slots__ = (
+        'level_id', 'title', 'story', 'objective', 'hint', 'sql_concepts',
+        'tables_unlocked', 'expected_query', 'expected_columns',
+        'expected_columns_lower', 'expected_row_count', 'order_matters',
+        '_summary_dict', '_public_dict', '_full_dict'
+    )
+    
     def __init__(
         self,
         level_id: int,
@@ -27,27 +45,46 @@ class Level:
         self.story = story
         self.objective = objective
         self.hint = hint
-        self.sql_concepts = sql_concepts
-        self.tables_unlocked = tables_unlocked
-        self.expected_query = expected_query
-        self.expected_columns = expected_columns
+        # List fields are never mutated, so they're stored as tuples
+        self.sql_concepts = sql_concepts = _shared_tuple(sql_concepts)
+        self.tables_unlocked = tables_unlocked = _shared_tuple(tables_unlocked)
+        # The query blocks are indented to match the source; store them clean
+        self.expected_query = textwrap.dedent(expected_query).strip()
+        self.expected_columns = _shared_tuple(expected_columns) if expected_columns else None
+        # Lowercased once for the answer checker's case-insensitive column check
+        self.expected_columns_lower = (
+            frozenset(col.lower() for col in expected_columns) if expected_columns else frozenset()
+        )
         self.expected_row_count = expected_row_count
         self.order_matters = order_matters
+        
+        # Level content never changes, so the API payloads are built once.
+        # The summary is what the level selector needs; the story and
+        # objective text only go out with a single level's details.
+        self._summary_dict = {
+            'id': level_id,
+            'title': title,
+            'sql_concepts': sql_concepts,
+            'tables_unlocked': tables_unlocked
+        }
+        self._public_dict = {
+            'id': level_id,
+            'title': title,
+            'story': story,
+            'objective': objective,
+            'hint': hint,
+            'sql_concepts': sql_concepts,
+            'tables_unlocked': tables_unlocked
+        }
+        self._full_dict = dict(self._public_dict, expected_query=self.expected_query)
     
     def to_dict(self, include_solution: bool = False) -> Dict[str, Any]:
-        """Convert to dictionary for API response"""
-        data = {
-            'id': self.level_id,
-            'title': self.title,
-            'story': self.story,
-            'objective': self.objective,
-            'hint': self.hint,
-            'sql_concepts': self.sql_concepts,
-            'tables_unlocked': self.tables_unlocked
-        }
-        if include_solution:
-            data['expected_query'] = self.expected_query
-        return data
+        """Convert to dictionary for API response (shared; do not modify)"""
+        return self._full_dict if include_solution else self._public_dict
+    
+    def to_summary_dict(self) -> Dict[str, Any]:
+        """Convert to the lightweight level-list entry (shared; do not modify)"""
+        return self._summary_dict
 
 
 # =============================================================================
@@ -329,10 +366,28 @@ LEVELS: Dict[int, Level] = {
     )
 }
 
+# Levels in order, and their list entries (no story text or solutions)
+LEVELS_LIST: Tuple[Level, ...] = tuple(LEVELS.values())
+LEVELS_PUBLIC: List[Dict[str, Any]] = [level.to_summary_dict() for level in LEVELS_LIST]
+TOTAL_LEVELS = len(LEVELS_LIST)
+
+# Levels indexed directly by level ID (IDs are 1..N with no gaps; index 0 is unused)
+LEVELS_BY_ID: Tuple[Optional[Level], ...] = (None,) + LEVELS_LIST
+
+# Unlocked tables as sets, indexed the same way
+_TABLES_BY_LEVEL = tuple(
+    frozenset(level.tables_unlocked) if level else frozenset()
+    for level in LEVELS_BY_ID
+)
+
 
 def get_level(level_id: int) -> Level:
     """Get a level by ID"""
-    return LEVELS.get(level_id)
+    try:
+        return LEVELS_BY_ID[level_id] if 0 < level_id <= TOTAL_LEVELS else None
+    except TypeError:
+        # Non-integer IDs (e.g. strings from request JSON) match no level
+        return None
 
 
 def get_all_levels() -> Dict[int, Level]:
@@ -342,10 +397,17 @@ def get_all_levels() -> Dict[int, Level]:
 
 def get_level_count() -> int:
     """Get total number of levels"""
-    return len(LEVELS)
+    return TOTAL_LEVELS
 
 
-def get_tables_for_level(level_id: int) -> List[str]:
-    """Get list of tables unlocked for a specific level"""
+def get_tables_for_level(level_id: int) -> Tuple[str, ...]:
+    """Get the tables unlocked for a specific level"""
     level = get_level(level_id)
-    return level.tables_unlocked if level else []
+    return level.tables_unlocked if level else ()
+
+
+def get_tables_set_for_level(level_id: int) -> FrozenSet[str]:
+    """Get the set of tables unlocked for a level, for membership checks"""
+    if 0 < level_id < len(_TABLES_BY_LEVEL):
+        return _TABLES_BY_LEVEL[level_id]
+    return frozenset()
@@ -2,22 +2,78 @@
 SQL Detective Game - Game Routes
 Handles level progression and game state
 """
-from flask import Blueprint, jsonify, request, session
-from levels import get_level, get_all_levels, get_level_count, get_tables_for_level
+import hashlib
+
+from flask import Blueprint, Response, request
+from levels import LEVELS, get_level, get_tables_for_level, get_tables_set_for_level, LEVELS_PUBLIC, TOTAL_LEVELS
+from services.json_response import dumps, fast_json
+from services.progress import player_progress, completed_levels, reset_completed_levels
 from services.query_executor import query_executor
 
 game_bp = Blueprint('game', __name__, url_prefix='/api/game')
 
+# Level content is static, so its responses are serialized once at import
+_LEVELS_JSON = dumps({
+    'success': True,
+    'levels': LEVELS_PUBLIC,
+    'total_levels': TOTAL_LEVELS
+})
+_LEVEL_DETAIL_JSON = {
+    level_id: dumps({'success': True, 'level': level.to_dict(include_solution=False)})
+    for level_id, level in LEVELS.items()
+}
+
+
+def _etag(body: bytes) -> str:
+    """Entity tag for a pre-serialized response body"""
+    return hashlib.md5(body).hexdigest()
+
+
+_LEVELS_ETAG = _etag(_LEVELS_JSON)
+_LEVEL_DETAIL_ETAG = {level_id: _etag(body) for level_id, body in _LEVEL_DETAIL_JSON.items()}
+
+# The level list is the same for everyone. Level details and schemas are
+# gated on the player's progress, so browsers revalidate those every time
+# (a matching ETag still turns the reply into an empty 304).
+_PUBLIC_CACHE_CONTROL = 'public, max-age=86400, immutable'
+_GATED_CACHE_CONTROL = 'private, no-cache'
+
+_DEFAULT_PROGRESS_JSON = dumps({
+    'success': True,
+    'current_level': 1,
+    'completed_levels': [],
+    'total_queries': 0,
+    'correct_answers': 0
+})
+
+# /tables, /tables/<name>/sample and /tables/<name>/schema responses. The
+# game database is created after the routes are imported, so entries are
+# built on first request rather than at import.
+_TABLES_JSON = {}
+_SAMPLE_JSON = {}
+_SCHEMA_JSON = {}
+
+
+def invalidate_tables_cache():
+    """Drop cached table responses (call after the game schema changes)"""
+    _TABLES_JSON.clear()
+    _SAMPLE_JSON.clear()
+    _SCHEMA_JSON.clear()
+
+
+def _conditional_json(body: bytes, etag: str, cache_control: str) -> Response:
+    """Serve cached JSON bytes, answering a matching If-None-Match with 304"""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response.make_conditional(request)
+
 
 @game_bp.route('/levels', methods=['GET'])
 def get_levels():
-    """Get all levels (without solutions)"""
-    levels = get_all_levels()
-    return jsonify({
-        'success': True,
-        'levels': [level.to_dict(include_solution=False) for level in levels.values()],
-        'total_levels': get_level_count()
-    })
+    """Get the level list (titles and concepts; details come per level)"""
+    # Same for every player: keep player progress out of this route
+    return _conditional_json(_LEVELS_JSON, _LEVELS_ETAG, _PUBLIC_CACHE_CONTROL)
 
 
 @game_bp.route('/levels/<int:level_id>', methods=['GET'])
@@ -26,47 +82,58 @@ def get_level_details(level_id):
     level = get_level(level_id)
     
     if not level:
-        return jsonify({
+        return fast_json({
             'success': False,
             'error': f'Level {level_id} not found'
-        }), 404
+        }, 404)
     
     # Check if player has unlocked this level
-    current_level = session.get('current_level', 1)
+    current_level = player_progress().get('current_level', 1)
     if level_id > current_level:
-        return jsonify({
+        return fast_json({
             'success': False,
             'error': 'Level not yet unlocked',
             'current_level': current_level
-        }), 403
+        }, 403)
     
-    return jsonify({
-        'success': True,
-        'level': level.to_dict(include_solution=False)
-    })
+    return _conditional_json(
+        _LEVEL_DETAIL_JSON[level_id], _LEVEL_DETAIL_ETAG[level_id], _GATED_CACHE_CONTROL
+    )
 
 
 @game_bp.route('/progress', methods=['GET'])
 def get_progress():
     """Get player's current progress"""
-    return jsonify({
+    progress = player_progress()
+    current_level = progress.get('current_level', 1)
+    completed = completed_levels(progress)
+    total_queries = progress.get('total_queries', 0)
+    correct_answers = progress.get('correct_answers', 0)
+    
+    # New and freshly reset players all get the same body
+    if (current_level == 1 and not completed
+            and not total_queries and not correct_answers):
+        return Response(_DEFAULT_PROGRESS_JSON, mimetype='application/json')
+    
+    return fast_json({
         'success': True,
-        'current_level': session.get('current_level', 1),
-        'completed_levels': session.get('completed_levels', []),
-        'total_queries': session.get('total_queries', 0),
-        'correct_answers': session.get('correct_answers', 0)
+        'current_level': current_level,
+        'completed_levels': completed,
+        'total_queries': total_queries,
+        'correct_answers': correct_answers
     })
 
 
 @game_bp.route('/progress/reset', methods=['POST'])
 def reset_progress():
     """Reset player progress"""
-    session['current_level'] = 1
-    session['completed_levels'] = []
-    session['total_queries'] = 0
-    session['correct_answers'] = 0
+    progress = player_progress()
+    progress['current_level'] = 1
+    reset_completed_levels(progress)
+    progress['total_queries'] = 0
+    progress['correct_answers'] = 0
     
-    return jsonify({
+    return fast_json({
         'success': True,
         'message': 'Progress reset. Starting from Level 1.'
     })
@@ -75,14 +142,14 @@ def reset_progress():
 @game_bp.route('/progress/unlock/<int:level_id>', methods=['POST'])
 def unlock_level(level_id):
     """Unlock a specific level (for development/testing)"""
-    if level_id < 1 or level_id > get_level_count():
-        return jsonify({
+    if level_id < 1 or level_id > TOTAL_LEVELS:
+        return fast_json({
             'success': False,
             'error': 'Invalid level ID'
-        }), 400
+        }, 400)
     
-    session['current_level'] = level_id
-    return jsonify({
+    player_progress()['current_level'] = level_id
+    return fast_json({
         'success': True,
         'message': f'Unlocked Level {level_id}'
     })
@@ -91,70 +158,78 @@ def unlock_level(level_id):
 @game_bp.route('/tables', methods=['GET'])
 def get_available_tables():
     """Get list of tables available for current level"""
-    current_level = session.get('current_level', 1)
-    tables = get_tables_for_level(current_level)
-    
-    # Get schema for each table
-    table_schemas = {}
-    for table in tables:
-        schema = query_executor.get_table_schema(table)
-        if schema:
-            table_schemas[table] = schema
+    current_level = player_progress().get('current_level', 1)
+    body = _TABLES_JSON.get(current_level)
+    if body is None:
+        tables = get_tables_for_level(current_level)
+        table_schemas = query_executor.get_table_schemas(tables)
+        body = dumps({
+            'success': True,
+            'level': current_level,
+            'tables': tables,
+            'schemas': table_schemas
+        })
+        # Only keep complete responses so a missing database isn't cached
+        if len(table_schemas) == len(tables):
+            _TABLES_JSON[current_level] = body
     
-    return jsonify({
-        'success': True,
-        'level': current_level,
-        'tables': tables,
-        'schemas': table_schemas
-    })
+    return Response(body, mimetype='application/json')
 
 
 @game_bp.route('/tables/<table_name>/sample', methods=['GET'])
 def get_table_sample(table_name):
     """Get sample data from a table"""
-    current_level = session.get('current_level', 1)
-    available_tables = get_tables_for_level(current_level)
+    current_level = player_progress().get('current_level', 1)
     
     # Check if table is available for current level
-    if table_name not in available_tables:
-        return jsonify({
+    if table_name not in get_tables_set_for_level(current_level):
+        return fast_json({
             'success': False,
             'error': f'Table {table_name} is not available for this level'
-        }), 403
+        }, 403)
     
-    success, result = query_executor.get_sample_data(table_name, limit=5)
+    body = _SAMPLE_JSON.get(table_name)
+    if body is None:
+        success, result = query_executor.get_sample_data(table_name, limit=5)
+        body = dumps({
+            'success': success,
+            'table': table_name,
+            'columns': result.get('columns', []),
+            'rows': result.get('rows', []),
+            'error': result.get('error')
+        })
+        if success:
+            _SAMPLE_JSON[table_name] = body
     
-    return jsonify({
-        'success': success,
-        'table': table_name,
-        'columns': result.get('columns', []),
-        'rows': result.get('rows', []),
-        'error': result.get('error')
-    })
+    return Response(body, mimetype='application/json')
 
 
 @game_bp.route('/tables/<table_name>/schema', methods=['GET'])
 def get_table_schema(table_name):
     """Get schema for a specific table"""
-    current_level = session.get('current_level', 1)
-    available_tables = get_tables_for_level(current_level)
+    current_level = player_progress().get('current_level', 1)
     
-    if table_name not in available_tables:
-        return jsonify({
+    if table_name not in get_tables_set_for_level(current_level):
+        return fast_json({
             'success': False,
             'error': f'Table {table_name} is not available for this level'
-        }), 403
-    
-    schema = query_executor.get_table_schema(table_name)
+        }, 403)
     
-    if schema is None:
-        return jsonify({
-            'success': False,
-            'error': f'Table {table_name} not found'
-        }), 404
+    cached = _SCHEMA_JSON.get(table_name)
+    if cached is None:
+        schema = query_executor.get_table_schema(table_name)
+        
+        if schema is None:
+            return fast_json({
+                'success': False,
+                'error': f'Table {table_name} not found'
+            }, 404)
+        
+        body = dumps({
+            'success': True,
+            'table': table_name,
+            'schema': schema
+        })
+        cached = _SCHEMA_JSON[table_name] = (body, _etag(body))
     
-    return jsonify({
-        'success': True,
-        'table': table_name,
-        'schema': schema
-    })
+    return _conditional_json(cached[0], cached[1], _GATED_CACHE_CONTROL)
@@ -4,12 +4,13 @@ Handles SQL query execution and answer checking
 """
 import time
 import uuid
-from flask import Blueprint, jsonify, request, session
+from flask import Blueprint, current_app, request, session
+from services.json_response import fast_json
 from services.query_executor import query_executor
 from services.sql_validator import validate_query, get_blocked_keywords
 from services.level_checker import level_checker
+from services.progress import player_progress, mark_level_completed
 from levels import get_tables_for_level
-import config
 
 # Import player analytics for logging
 try:
@@ -21,6 +22,11 @@ except ImportError:
 query_bp = Blueprint('query', __name__, url_prefix='/api/query')
 
 
+def get_player_analytics():
+    """Get the application-scoped PlayerAnalytics shared by all requests"""
+    return current_app.extensions['analytics']['players']
+
+
 def get_or_create_session_id():
     """Get or create a unique session ID for analytics"""
     if 'analytics_session_id' not in session:
@@ -28,8 +34,7 @@ def get_or_create_session_id():
         # Log session start if analytics enabled
         if ANALYTICS_ENABLED:
             try:
-                analytics = PlayerAnalytics(config.DATABASE_PATH)
-                analytics.log_session_start(
+                get_player_analytics().log_session_start(
                     session['analytics_session_id'],
                     request.headers.get('User-Agent')
                 )
@@ -38,16 +43,19 @@ def get_or_create_session_id():
     return session['analytics_session_id']
 
 
-def log_query_attempt(level_id, query, is_valid, is_correct=None, 
+def _loggable_level_id(level_id):
+    """Whether a request's level_id can be stored (the analytics columns are integer NOT NULL)"""
+    return isinstance(level_id, int) and not isinstance(level_id, bool)
+
+
+def log_query_attempt(session_id, level_id, query, is_valid, is_correct=None, 
                       execution_time_ms=None, error_message=None):
     """Log a query attempt to analytics"""
-    if not ANALYTICS_ENABLED:
+    if not ANALYTICS_ENABLED or not _loggable_level_id(level_id):
         return
     
     try:
-        session_id = get_or_create_session_id()
-        analytics = PlayerAnalytics(config.DATABASE_PATH)
-        analytics.log_query_attempt(
+        get_player_analytics().log_query_attempt(
             session_id=session_id,
             level_id=level_id,
             query_text=query,
@@ -60,15 +68,13 @@ def log_query_attempt(level_id, query, is_valid, is_correct=None,
         print(f"Analytics logging error: {e}")
 
 
-def log_error(level_id, error_type, error_detail=None, query_fragment=None):
+def log_error(session_id, level_id, error_type, error_detail=None, query_fragment=None):
     """Log an error to analytics"""
-    if not ANALYTICS_ENABLED:
+    if not ANALYTICS_ENABLED or not _loggable_level_id(level_id):
         return
     
     try:
-        session_id = get_or_create_session_id()
-        analytics = PlayerAnalytics(config.DATABASE_PATH)
-        analytics.log_error(
+        get_player_analytics().log_error(
             session_id=session_id,
             level_id=level_id,
             error_type=error_type,
@@ -79,15 +85,13 @@ def log_error(level_id, error_type, error_detail=None, query_fragment=None):
         pass
 
 
-def log_level_completion(level_id, attempts_count, time_spent_seconds=None):
+def log_level_completion(session_id, level_id, attempts_count, time_spent_seconds=None):
     """Log a level completion to analytics"""
-    if not ANALYTICS_ENABLED:
+    if not ANALYTICS_ENABLED or not _loggable_level_id(level_id):
         return
     
     try:
-        session_id = get_or_create_session_id()
-        analytics = PlayerAnalytics(config.DATABASE_PATH)
-        analytics.log_level_completion(
+        get_player_analytics().log_level_completion(
             session_id=session_id,
             level_id=level_id,
             attempts_count=attempts_count,
@@ -101,11 +105,13 @@ def log_level_completion(level_id, attempts_count, time_spent_seconds=None):
 def execute_query():
     """Execute a SQL query and return results"""
     data = request.get_json()
-    level_id = data.get('level_id', session.get('current_level', 1))
+    progress = player_progress()
+    level_id = data.get('level_id', progress.get('current_level', 1))
+    session_id = get_or_create_session_id()
     
     if not data or 'query' not in data:
-        log_error(level_id, 'EMPTY_REQUEST', 'No query provided')
-        return jsonify({
+        log_error(session_id, level_id, 'EMPTY_REQUEST', 'No query provided')
+        return fast_json({
             'success': False,
             'error': 'No query provided'
         }), 400
@@ -113,14 +119,14 @@ def execute_query():
     query = data.get('query', '').strip()
     
     if not query:
-        log_error(level_id, 'EMPTY_QUERY', 'Query was empty')
-        return jsonify({
+        log_error(session_id, level_id, 'EMPTY_QUERY', 'Query was empty')
+        return fast_json({
             'success': False,
             'error': 'Query cannot be empty'
         }), 400
     
-    # Track total queries in session
-    session['total_queries'] = session.get('total_queries', 0) + 1
+    # Track total queries in player progress
+    progress['total_queries'] = progress.get('total_queries', 0) + 1
     
     # Execute the query with timing
     start_time = time.time()
@@ -130,6 +136,7 @@ def execute_query():
     # Log to analytics
     if success:
         log_query_attempt(
+            session_id=session_id,
             level_id=level_id,
             query=query,
             is_valid=True,
@@ -140,15 +147,16 @@ def execute_query():
         # Categorize error type
         error_type = categorize_error(error_msg)
         log_query_attempt(
+            session_id=session_id,
             level_id=level_id,
             query=query,
             is_valid=False,
             execution_time_ms=execution_time_ms,
             error_message=error_msg
         )
-        log_error(level_id, error_type, error_msg, query)
+        log_error(session_id, level_id, error_type, error_msg, query)
     
-    return jsonify({
+    return fast_json({
         'success': success,
         'columns': result.get('columns', []),
         'rows': result.get('rows', []),
@@ -159,26 +167,28 @@ def execute_query():
     })
 
 
+# Error message markers and their categories, checked in order
+_ERROR_MARKERS = (
+    ('syntax', 'SYNTAX_ERROR'),
+    ('no such table', 'TABLE_NOT_FOUND'),
+    ('no such column', 'COLUMN_NOT_FOUND'),
+    ('blocked', 'BLOCKED_KEYWORD'),
+    ('not allowed', 'BLOCKED_KEYWORD'),
+    ('timeout', 'TIMEOUT'),
+    ('ambiguous', 'AMBIGUOUS_COLUMN'),
+    ('group by', 'AGGREGATION_ERROR'),
+    ('aggregate', 'AGGREGATION_ERROR'),
+)
+
+
 def categorize_error(error_msg):
     """Categorize error message into error type"""
     error_lower = error_msg.lower()
     
-    if 'syntax' in error_lower:
-        return 'SYNTAX_ERROR'
-    elif 'no such table' in error_lower:
-        return 'TABLE_NOT_FOUND'
-    elif 'no such column' in error_lower:
-        return 'COLUMN_NOT_FOUND'
-    elif 'blocked' in error_lower or 'not allowed' in error_lower:
-        return 'BLOCKED_KEYWORD'
-    elif 'timeout' in error_lower:
-        return 'TIMEOUT'
-    elif 'ambiguous' in error_lower:
-        return 'AMBIGUOUS_COLUMN'
-    elif 'group by' in error_lower or 'aggregate' in error_lower:
-        return 'AGGREGATION_ERROR'
-    else:
-        return 'OTHER_ERROR'
+    for marker, error_type in _ERROR_MARKERS:
+        if marker in error_lower:
+            return error_type
+    return 'OTHER_ERROR'
 
 
 @query_bp.route('/check', methods=['POST'])
@@ -187,34 +197,37 @@ def check_answer():
     data = request.get_json()
     
     if not data or 'query' not in data:
-        return jsonify({
+        return fast_json({
             'success': False,
             'error': 'No query provided'
         }), 400
     
     query = data.get('query', '').strip()
-    level_id = data.get('level_id', session.get('current_level', 1))
+    progress = player_progress()
+    level_id = data.get('level_id', progress.get('current_level', 1))
+    session_id = get_or_create_session_id()
     
     # Initialize level tracking
     level_key = f'level_{level_id}_attempts'
     level_start_key = f'level_{level_id}_start'
     
     # Track attempts for this level
-    session[level_key] = session.get(level_key, 0) + 1
-    attempts = session[level_key]
+    progress[level_key] = progress.get(level_key, 0) + 1
+    attempts = progress[level_key]
     
     # Track level start time
-    if level_start_key not in session:
-        session[level_start_key] = time.time()
+    if level_start_key not in progress:
+        progress[level_start_key] = time.time()
     
     # Track total queries
-    session['total_queries'] = session.get('total_queries', 0) + 1
+    progress['total_queries'] = progress.get('total_queries', 0) + 1
     
     # Check the answer
     result = level_checker.check_answer(level_id, query)
     
     # Log the attempt
     log_query_attempt(
+        session_id=session_id,
         level_id=level_id,
         query=query,
         is_valid=True,
@@ -223,35 +236,32 @@ def check_answer():
     
     if result['correct']:
         # Calculate time spent
-        time_spent = int(time.time() - session.get(level_start_key, time.time()))
+        time_spent = int(time.time() - progress.get(level_start_key, time.time()))
         
         # Log completion
-        log_level_completion(level_id, attempts, time_spent)
+        log_level_completion(session_id, level_id, attempts, time_spent)
         
         # Update progress
-        session['correct_answers'] = session.get('correct_answers', 0) + 1
-        completed = session.get('completed_levels', [])
-        if level_id not in completed:
-            completed.append(level_id)
-            session['completed_levels'] = completed
+        progress['correct_answers'] = progress.get('correct_answers', 0) + 1
+        mark_level_completed(progress, level_id)
         
         # Unlock next level
-        current = session.get('current_level', 1)
+        current = progress.get('current_level', 1)
         if level_id >= current and level_id < 7:
-            session['current_level'] = level_id + 1
+            progress['current_level'] = level_id + 1
         
         # Reset level tracking for next attempt
-        session.pop(level_key, None)
-        session.pop(level_start_key, None)
+        progress.pop(level_key, None)
+        progress.pop(level_start_key, None)
     
-    return jsonify({
+    return fast_json({
         'success': True,
         'correct': result['correct'],
         'message': result['message'],
         'user_result': result.get('user_result'),
         'hints': result.get('hints', []),
         'next_level': result.get('next_level'),
-        'current_level': session.get('current_level', 1)
+        'current_level': progress.get('current_level', 1)
     })
 
 
@@ -261,7 +271,7 @@ def validate_query_syntax():
     data = request.get_json()
     
     if not data or 'query' not in data:
-        return jsonify({
+        return fast_json({
             'success': False,
             'error': 'No query provided'
         }), 400
@@ -271,10 +281,10 @@ def validate_query_syntax():
     
     # Log validation errors
     if not is_valid:
-        level_id = data.get('level_id', session.get('current_level', 1))
-        log_error(level_id, 'VALIDATION_ERROR', error_msg, query)
+        level_id = data.get('level_id', player_progress().get('current_level', 1))
+        log_error(get_or_create_session_id(), level_id, 'VALIDATION_ERROR', error_msg, query)
     
-    return jsonify({
+    return fast_json({
         'success': True,
         'valid': is_valid,
         'error': error_msg if not is_valid else None
@@ -284,7 +294,7 @@ def validate_query_syntax():
 @query_bp.route('/blocked-keywords', methods=['GET'])
 def get_blocked():
     """Get list of blocked SQL keywords"""
-    return jsonify({
+    return fast_json({
         'success': True,
         'blocked_keywords': get_blocked_keywords()
     })
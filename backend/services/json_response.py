@@ -0,0 +1,25 @@
+"""
+SQL Detective Game - JSON Response Helper
+Serializes API payloads with orjson when it is available
+"""
+import json
+
+from flask import current_app
+
+try:
+    import orjson
+    ORJSON_ENABLED = True
+except ImportError:
+    ORJSON_ENABLED = False
+
+
+def dumps(obj) -> bytes:
+    """Serialize an object to compact JSON bytes"""
+    if ORJSON_ENABLED:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def fast_json(obj, status: int = 200):
+    """Build a JSON response like jsonify, using the faster encoder"""
+    return current_app.response_class(dumps(obj), status=status, mimetype='application/json')
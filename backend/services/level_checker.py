@@ -2,18 +2,28 @@
 SQL Detective Game - Level Checker Service
 Validates player answers against expected results
 """
-from typing import Dict, Any, Tuple, List, Set
+from typing import Dict, Any, Tuple, List, Set, Optional, FrozenSet, Iterator
 import sqlite3
 
 from services.query_executor import query_executor
 from levels.level_config import get_level, Level
 
 
+def _normalize_value(val: Any, _round=round, _float=float) -> Any:
+    """Normalize one cell for comparison (floats are rounded)"""
+    if type(val) is _float:
+        return _round(val, 2)
+    return val
+
+
 class LevelChecker:
     """Handles level answer verification"""
     
     def __init__(self):
         self.executor = query_executor
+        # Expected answers are static, so each level's expected result and
+        # its normalized rows (and row set) are computed once
+        self._expected_cache: Dict[int, Tuple[Dict[str, Any], List[Tuple], Optional[FrozenSet]]] = {}
     
     def check_answer(self, level_id: int, user_query: str) -> Dict[str, Any]:
         """
@@ -51,13 +61,10 @@ class LevelChecker:
                 'hints': self._get_error_hints(user_result.get('error', ''), level)
             }
         
-        # Execute expected query to get expected result
-        _, expected_result = self.executor.execute_query(level.expected_query)
-        
         # Compare results
         is_correct, comparison_details = self._compare_results(
             user_result, 
-            expected_result, 
+            self._get_expected(level), 
             level
         )
         
@@ -76,18 +83,35 @@ class LevelChecker:
                 'hints': self._get_incorrect_hints(comparison_details, level)
             }
     
+    def _get_expected(self, level: Level) -> Tuple[Dict[str, Any], List[Tuple], Optional[FrozenSet]]:
+        """
+        Get a level's expected result with its normalized rows, and the set of
+        those rows when order doesn't matter. Executed once per level.
+        """
+        expected = self._expected_cache.get(level.level_id)
+        if expected is None:
+            success, expected_result = self.executor.execute_trusted_query(level.expected_query)
+            expected_data = self._normalize_rows(expected_result['rows'])
+            expected_set = None if level.order_matters else frozenset(expected_data)
+            expected = (expected_result, expected_data, expected_set)
+            # A failed run (e.g. database not ready) is retried next time
+            if success:
+                self._expected_cache[level.level_id] = expected
+        return expected
+    
     def _compare_results(
         self, 
         user_result: Dict[str, Any], 
-        expected_result: Dict[str, Any],
+        expected: Tuple[Dict[str, Any], List[Tuple], Optional[FrozenSet]],
         level: Level
     ) -> Tuple[bool, Dict[str, Any]]:
         """
-        Compare user result with expected result.
+        Compare user result with expected result (as returned by _get_expected).
         
         Returns:
             Tuple of (is_correct, details_dict)
         """
+        expected_result, expected_data, expected_set = expected
         details = {'message': '', 'issues': []}
         
         # Check if user got any rows
@@ -106,28 +130,24 @@ class LevelChecker:
         # Check required columns if specified
         if level.expected_columns:
             user_cols_lower = {col.lower() for col in user_result['columns']}
-            expected_cols_lower = {col.lower() for col in level.expected_columns}
             
-            missing_cols = expected_cols_lower - user_cols_lower
+            missing_cols = level.expected_columns_lower - user_cols_lower
             if missing_cols:
                 details['message'] = f"Missing required columns: {', '.join(missing_cols)}"
                 details['issues'].append('missing_columns')
                 return False, details
         
         # Compare actual data
-        user_data = self._normalize_rows(user_result['rows'])
-        expected_data = self._normalize_rows(expected_result['rows'])
-        
         if level.order_matters:
-            # Order matters - compare directly
-            if user_data != expected_data:
+            # Order matters - compare directly (lengths first, which is free)
+            if (len(user_result['rows']) != len(expected_data)
+                    or self._normalize_rows(user_result['rows']) != expected_data):
                 details['message'] = "Data or ordering doesn't match expected result."
                 details['issues'].append('data_mismatch')
                 return False, details
         else:
-            # Order doesn't matter - compare as sets
-            user_set = set(user_data)
-            expected_set = set(expected_data)
+            # Order doesn't matter - compare as sets, built straight from the rows
+            user_set = set(self._iter_normalized_rows(user_result['rows']))
             
             if user_set != expected_set:
                 missing = expected_set - user_set
@@ -147,20 +167,11 @@ class LevelChecker:
     
     def _normalize_rows(self, rows: List[List[Any]]) -> List[Tuple]:
         """Convert rows to normalized tuple format for comparison"""
-        normalized = []
-        for row in rows:
-            normalized_row = []
-            for val in row:
-                # Convert to string for comparison, handling None
-                if val is None:
-                    normalized_row.append(None)
-                elif isinstance(val, float):
-                    # Round floats for comparison
-                    normalized_row.append(round(val, 2))
-                else:
-                    normalized_row.append(val)
-            normalized.append(tuple(normalized_row))
-        return normalized
+        return list(self._iter_normalized_rows(rows))
+    
+    def _iter_normalized_rows(self, rows: List[List[Any]]) -> Iterator[Tuple]:
+        """Yield rows in normalized tuple format, one at a time"""
+        return (tuple(map(_normalize_value, row)) for row in rows)
     
     def _get_error_hints(self, error: str, level: Level) -> List[str]:
         """Generate hints based on error message"""
@@ -0,0 +1,118 @@
+"""
+SQL Detective Game - Player Progress Service
+Chooses where per-player progress (level, attempts, counters) is kept
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, MutableMapping, Optional
+
+from flask import current_app, session
+
+# Session key holding the client id when progress is kept in process
+CLIENT_ID_KEY = 'progress_client_id'
+
+# Completed levels are stored as a bitmask (bit N set = level N completed)
+COMPLETED_MASK_KEY = 'completed_mask'
+
+# Fallback cap on in-process players when the config doesn't set one
+DEFAULT_MAX_PLAYERS = 10_000
+
+# Progress mappings by client id, least recently used first
+# (only used with PROGRESS_IN_PROCESS)
+_PROGRESS: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+_progress_lock = threading.Lock()
+
+
+class _InProcessProgress(MutableMapping):
+    """
+    One client's progress kept in _PROGRESS.
+    Reads for a client with nothing stored see an empty mapping (so the
+    routes fall back to their defaults); the client id and the stored
+    entry are only created by the first write.
+    """
+    
+    def __init__(self, client_id: Optional[str]):
+        self._client_id = client_id
+        self._data = None
+        if client_id is not None:
+            with _progress_lock:
+                self._data = _PROGRESS.get(client_id)
+                if self._data is not None:
+                    _PROGRESS.move_to_end(client_id)
+    
+    def _store(self) -> Dict[str, Any]:
+        if self._data is None:
+            if self._client_id is None:
+                self._client_id = session[CLIENT_ID_KEY] = uuid.uuid4().hex
+            max_players = current_app.config.get('PROGRESS_IN_PROCESS_MAX_PLAYERS', DEFAULT_MAX_PLAYERS)
+            with _progress_lock:
+                self._data = _PROGRESS.setdefault(self._client_id, {})
+                _PROGRESS.move_to_end(self._client_id)
+                while len(_PROGRESS) > max_players:
+                    _PROGRESS.popitem(last=False)
+        return self._data
+    
+    def __getitem__(self, key: str) -> Any:
+        if self._data is None:
+            raise KeyError(key)
+        return self._data[key]
+    
+    def __setitem__(self, key: str, value: Any):
+        self._store()[key] = value
+    
+    def __delitem__(self, key: str):
+        if self._data is None:
+            raise KeyError(key)
+        del self._data[key]
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data or ())
+    
+    def __len__(self) -> int:
+        return len(self._data or ())
+
+
+def player_progress() -> MutableMapping[str, Any]:
+    """
+    Get the current player's progress mapping.
+    
+    By default this is the Flask session itself. With PROGRESS_IN_PROCESS
+    enabled the cookie only carries a client id and progress lives in this
+    process, so updates don't re-sign and re-send the whole cookie. That
+    suits a single-process local game; progress is lost on restart and not
+    shared between workers, so multi-worker deployments keep the default.
+    At most PROGRESS_IN_PROCESS_MAX_PLAYERS players are kept, dropping the
+    least recently active first.
+    """
+    if not current_app.config.get('PROGRESS_IN_PROCESS'):
+        return session
+    return _InProcessProgress(session.get(CLIENT_ID_KEY))
+
+
+def _completed_mask(progress: MutableMapping[str, Any]) -> int:
+    """Completed-level bitmask, folding in a list left by older sessions"""
+    mask = progress.get(COMPLETED_MASK_KEY, 0)
+    for level_id in progress.get('completed_levels', ()):
+        mask |= 1 << level_id
+    return mask
+
+
+def completed_levels(progress: MutableMapping[str, Any]) -> List[int]:
+    """IDs of the levels the player has completed, in ascending order"""
+    mask = _completed_mask(progress)
+    return [level_id for level_id in range(1, mask.bit_length()) if mask >> level_id & 1]
+
+
+def mark_level_completed(progress: MutableMapping[str, Any], level_id: int):
+    """Record a level as completed"""
+    mask = _completed_mask(progress) | (1 << level_id)
+    if mask != progress.get(COMPLETED_MASK_KEY):
+        progress[COMPLETED_MASK_KEY] = mask
+    progress.pop('completed_levels', None)
+
+
+def reset_completed_levels(progress: MutableMapping[str, Any]):
+    """Forget every completed level"""
+    progress[COMPLETED_MASK_KEY] = 0
+    progress.pop('completed_levels', None)
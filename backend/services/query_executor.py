@@ -2,15 +2,37 @@
 SQL Detective Game - Query Executor Service
 Safely executes read-only SQL queries against the database
 """
+import atexit
 import sqlite3
+import threading
 import time
-from typing import Tuple, List, Dict, Any, Optional
+from typing import Tuple, List, Dict, Any, Optional, FrozenSet
 from contextlib import contextmanager
 
 from config import Config
 from services.sql_validator import validate_query, sanitize_query
 
 
+# Applied once to each pooled connection. The mmap and page cache keep the
+# game tables in memory across queries; query_only backs up mode=ro.
+READ_ONLY_PRAGMAS = (
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA query_only=1",
+)
+
+# Tables the executor's connections refuse to read
+HIDDEN_TABLES = frozenset(name.lower() for name in Config.HIDDEN_TABLES)
+
+
+def _deny_hidden_tables(action, arg1, arg2, db_name, trigger_name):
+    """sqlite authorizer: refuse any read of a hidden table"""
+    if action == sqlite3.SQLITE_READ and arg1 and arg1.lower() in HIDDEN_TABLES:
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+
 class QueryExecutor:
     """Handles safe execution of SQL queries"""
     
@@ -18,24 +40,50 @@ class QueryExecutor:
         self.db_path = db_path or Config.DATABASE_PATH
         self.timeout = Config.QUERY_TIMEOUT
         self.max_rows = Config.MAX_RESULT_ROWS
+        # Game tables are read-only, so table previews, schemas and the
+        # table list never change once the database is set up
+        self._sample_cache: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._schema_cache: Dict[str, List[Dict[str, Any]]] = {}
+        self._tables_cache: Optional[List[str]] = None
+        self._table_set: FrozenSet[str] = frozenset()
+        # One read-only connection per thread, kept open for reuse
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        atexit.register(self.close_connections)
     
     @contextmanager
     def get_connection(self):
         """
         Context manager for read-only database connection.
         Uses URI mode with read-only flag for extra safety.
+        The connection is cached per thread and stays open afterwards.
         """
-        # Connect in read-only mode using URI
-        conn = sqlite3.connect(
-            f'file:{self.db_path}?mode=ro',
-            uri=True,
-            timeout=self.timeout
-        )
-        conn.row_factory = sqlite3.Row  # Enable column name access
-        try:
-            yield conn
-        finally:
-            conn.close()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Connect in read-only mode using URI
+            conn = sqlite3.connect(
+                f'file:{self.db_path}?mode=ro',
+                uri=True,
+                timeout=self.timeout
+            )
+            for pragma in READ_ONLY_PRAGMAS:
+                conn.execute(pragma)
+            conn.set_authorizer(_deny_hidden_tables)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        yield conn
+    
+    def close_connections(self):
+        """Close every cached connection (called at exit)"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
     
     def execute_query(self, query: str) -> Tuple[bool, Dict[str, Any]]:
         """
@@ -48,7 +96,7 @@ class QueryExecutor:
             Tuple of (success, result_dict)
             result_dict contains:
                 - columns: list of column names
-                - rows: list of row data
+                - rows: list of row tuples
                 - row_count: number of rows
                 - execution_time: time taken in ms
                 - error: error message if failed
@@ -67,21 +115,40 @@ class QueryExecutor:
                 'execution_time': 0
             }
         
+        return self.execute_trusted_query(query)
+    
+    def execute_trusted_query(self, query: str) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Executes a query without sanitizing or validating it.
+        Only for the game's own queries (e.g. a level's expected query);
+        player input must go through execute_query.
+        
+        Returns:
+            Same format as execute_query
+        """
         start_time = time.time()
         
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute(query)
-                
-                # Get column names
-                columns = [description[0] for description in cursor.description] if cursor.description else []
-                
-                # Fetch results (with limit for safety)
-                rows = cursor.fetchmany(self.max_rows)
+                try:
+                    cursor.execute(query)
+                    
+                    # Get column names
+                    columns = [description[0] for description in cursor.description] if cursor.description else []
+                    
+                    # Fetch results (with limit for safety); plain tuples
+                    # serialize to JSON arrays as they are. One extra row
+                    # tells whether the result was really cut off.
+                    rows_data = cursor.fetchmany(self.max_rows + 1)
+                finally:
+                    # Reset a partly read statement so the reused connection
+                    # doesn't keep holding its read snapshot
+                    cursor.close()
                 
-                # Convert Row objects to lists for JSON serialization
-                rows_data = [list(row) for row in rows]
+                truncated = len(rows_data) > self.max_rows
+                if truncated:
+                    del rows_data[self.max_rows:]
                 
                 execution_time = round((time.time() - start_time) * 1000, 2)
                 
@@ -91,7 +158,7 @@ class QueryExecutor:
                     'row_count': len(rows_data),
                     'execution_time': execution_time,
                     'error': None,
-                    'truncated': len(rows_data) == self.max_rows
+                    'truncated': truncated
                 }
                 
         except sqlite3.OperationalError as e:
@@ -114,8 +181,14 @@ class QueryExecutor:
             }
             
         except sqlite3.Error as e:
+            error_msg = str(e)
+            # Raised by _deny_hidden_tables
+            if 'prohibited' in error_msg or 'not authorized' in error_msg:
+                error_msg = "Access to that table is not allowed."
+            else:
+                error_msg = f"Database error: {error_msg}"
             return False, {
-                'error': f"Database error: {str(e)}",
+                'error': error_msg,
                 'columns': [],
                 'rows': [],
                 'row_count': 0,
@@ -139,8 +212,13 @@ class QueryExecutor:
             table_name: Name of the table
             
         Returns:
-            List of column info dicts or None if table doesn't exist
+            List of column info dicts (shared; do not modify)
+            or None if table doesn't exist
         """
+        schema = self._schema_cache.get(table_name)
+        if schema is not None:
+            return schema
+        
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
@@ -150,7 +228,7 @@ class QueryExecutor:
                 if not columns:
                     return None
                 
-                return [
+                schema = [
                     {
                         'name': col[1],
                         'type': col[2],
@@ -161,9 +239,59 @@ class QueryExecutor:
                 ]
         except:
             return None
+        
+        # Only tables that exist are cached, so arbitrary names can't grow it
+        self._schema_cache[table_name] = schema
+        return schema
+    
+    def get_table_schemas(self, table_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Gets the schema information for several tables in one query.
+        
+        Args:
+            table_names: Names of the tables
+            
+        Returns:
+            Dict of table name to column info dicts, in the order given.
+            Tables that don't exist are left out.
+        """
+        if not table_names:
+            return {}
+        
+        placeholders = ','.join('?' * len(table_names))
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"""
+                    SELECT m.name, p.name, p.type, p."notnull", p.pk
+                    FROM sqlite_master m
+                    JOIN pragma_table_info(m.name) p
+                    WHERE m.type = 'table' AND m.name IN ({placeholders})
+                    ORDER BY m.name, p.cid
+                """, list(table_names))
+                
+                columns_by_table = {}
+                for table, name, col_type, notnull, pk in cursor.fetchall():
+                    columns_by_table.setdefault(table, []).append({
+                        'name': name,
+                        'type': col_type,
+                        'nullable': not notnull,
+                        'primary_key': bool(pk)
+                    })
+        except sqlite3.Error:
+            return {}
+        
+        return {
+            table: columns_by_table[table]
+            for table in table_names
+            if table in columns_by_table
+        }
     
     def get_all_tables(self) -> List[str]:
-        """Returns list of all table names in the database"""
+        """Returns list of all table names in the database (shared; do not modify)"""
+        if self._tables_cache is not None:
+            return self._tables_cache
+        
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
@@ -173,9 +301,22 @@ class QueryExecutor:
                     AND name NOT LIKE 'sqlite_%'
                     ORDER BY name
                 """)
-                return [row[0] for row in cursor.fetchall()]
+                tables = [row[0] for row in cursor.fetchall()
+                          if row[0].lower() not in HIDDEN_TABLES]
         except:
             return []
+        
+        # An empty list means the database isn't set up yet; look again next time
+        if tables:
+            self._tables_cache = tables
+            self._table_set = frozenset(tables)
+        return tables
+    
+    def is_known_table(self, table_name: str) -> bool:
+        """Whether a table with exactly this name exists in the database"""
+        if self._tables_cache is None:
+            self.get_all_tables()
+        return table_name in self._table_set
     
     def get_sample_data(self, table_name: str, limit: int = 5) -> Tuple[bool, Dict[str, Any]]:
         """
@@ -186,14 +327,22 @@ class QueryExecutor:
             limit: Number of rows to return
             
         Returns:
-            Same format as execute_query
+            Same format as execute_query (shared when cached; do not modify)
         """
-        # Validate table name to prevent injection
-        if not table_name.isidentifier():
+        # Only names of existing tables are ever put into SQL
+        if not self.is_known_table(table_name):
             return False, {'error': 'Invalid table name'}
         
-        query = f"SELECT * FROM {table_name} LIMIT {min(limit, 10)}"
-        return self.execute_query(query)
+        limit = min(int(limit), 10)
+        cached = self._sample_cache.get((table_name, limit))
+        if cached is not None:
+            return True, cached
+        
+        query = f'SELECT * FROM "{table_name}" LIMIT {limit}'
+        success, result = self.execute_query(query)
+        if success:
+            self._sample_cache[(table_name, limit)] = result
+        return success, result
 
 
 # Singleton instance
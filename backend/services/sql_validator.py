@@ -3,6 +3,7 @@ SQL Detective Game - SQL Validator Service
 Ensures only safe SELECT queries are executed
 """
 import re
+from functools import lru_cache
 from typing import Tuple
 
 # Blocked SQL keywords that could modify data or schema
@@ -13,6 +14,36 @@ BLOCKED_KEYWORDS = [
     'REINDEX', 'REPLACE', 'UPSERT', 'MERGE'
 ]
 
+# One alternation over all blocked keywords, so a query is scanned once.
+# Word boundaries avoid false positives (e.g., "UPDATED_AT" column).
+# Matching ignores case, so the query never needs an uppercased copy; the
+# (?a:) group limits that to ASCII case, so a match always uppercases to a
+# listed keyword (the Kelvin sign would otherwise match "K").
+BLOCKED_KEYWORDS_PATTERN = re.compile(
+    r'\b(?a:' + '|'.join(sorted(BLOCKED_KEYWORDS, key=len, reverse=True)) + r')\b',
+    re.IGNORECASE
+)
+
+# Patterns that are never allowed anywhere in a query
+SUSPICIOUS_PATTERNS = [
+    (re.compile(r'INTO\s+OUTFILE', re.IGNORECASE), "INTO OUTFILE is not allowed"),
+    (re.compile(r'INTO\s+DUMPFILE', re.IGNORECASE), "INTO DUMPFILE is not allowed"),
+    (re.compile(r'LOAD_FILE', re.IGNORECASE), "LOAD_FILE is not allowed"),
+    (re.compile(r'BENCHMARK\s*\(', re.IGNORECASE), "BENCHMARK is not allowed"),
+    (re.compile(r'SLEEP\s*\(', re.IGNORECASE), "SLEEP is not allowed"),
+]
+
+# Statements a query may start with (SELECT, or WITH for CTEs)
+ALLOWED_PREFIXES = ('SELECT', 'WITH')
+
+# Longest query accepted (prevents DoS via very long queries)
+MAX_QUERY_LENGTH = 5000
+
+# Validation and sanitizing are pure functions of the query text, and players
+# often resubmit the same query, so results are memoized. Only queries up to
+# MAX_QUERY_LENGTH are cached, bounding the memory the caches can hold.
+QUERY_CACHE_SIZE = 2048
+
 # Pattern to detect multiple statements
 MULTI_STATEMENT_PATTERN = re.compile(r';\s*\S', re.IGNORECASE)
 
@@ -20,7 +51,7 @@ MULTI_STATEMENT_PATTERN = re.compile(r';\s*\S', re.IGNORECASE)
 COMMENT_PATTERN = re.compile(r'(--.*$|/\*.*?\*/)', re.MULTILINE | re.DOTALL)
 
 
-def validate_query(query: str) -> Tuple[bool, str]:
+def _validate_query(query: str) -> Tuple[bool, str]:
     """
     Validates a SQL query to ensure it's safe to execute.
     
@@ -37,46 +68,42 @@ def validate_query(query: str) -> Tuple[bool, str]:
     # Normalize query for checking
     query = query.strip()
     
-    # Remove comments for analysis (but keep original for execution)
-    query_no_comments = COMMENT_PATTERN.sub('', query)
-    query_upper = query_no_comments.upper().strip()
+    # Reject over-long queries (DoS via very long queries) before any regex runs
+    if len(query) > MAX_QUERY_LENGTH:
+        return False, f"Query is too long. Maximum {MAX_QUERY_LENGTH} characters allowed."
+    
+    # Remove comments for analysis (but keep original for execution);
+    # most queries have none, so skip the regex unless a marker is present
+    if '--' in query or '/*' in query:
+        query_no_comments = COMMENT_PATTERN.sub('', query)
+    else:
+        query_no_comments = query
     
-    # 1. Check if query starts with SELECT or WITH (for CTEs)
-    if not query_upper.startswith('SELECT') and not query_upper.startswith('WITH'):
+    # 1. Check if query starts with SELECT or WITH (for CTEs); only the
+    # first few characters need uppercasing
+    if not query_no_comments.lstrip()[:6].upper().startswith(ALLOWED_PREFIXES):
         return False, "Only SELECT queries are allowed. Your query must start with SELECT or WITH."
     
     # 2. Check for blocked keywords
-    for keyword in BLOCKED_KEYWORDS:
-        # Use word boundary to avoid false positives (e.g., "UPDATED_AT" column)
-        pattern = rf'\b{keyword}\b'
-        if re.search(pattern, query_upper):
-            return False, f"Forbidden keyword detected: {keyword}. Only SELECT queries are allowed."
+    if BLOCKED_KEYWORDS_PATTERN.search(query_no_comments):
+        # Report the first offender in list order, as the error always has
+        found = {match.upper() for match in BLOCKED_KEYWORDS_PATTERN.findall(query_no_comments)}
+        keyword = next(k for k in BLOCKED_KEYWORDS if k in found)
+        return False, f"Forbidden keyword detected: {keyword}. Only SELECT queries are allowed."
     
     # 3. Check for multiple statements (prevent injection via second statement)
     if MULTI_STATEMENT_PATTERN.search(query):
         return False, "Multiple statements are not allowed. Please submit one query at a time."
     
-    # 4. Check query length (prevent DoS via very long queries)
-    if len(query) > 5000:
-        return False, "Query is too long. Maximum 5000 characters allowed."
-    
-    # 5. Check for suspicious patterns
-    suspicious_patterns = [
-        (r'INTO\s+OUTFILE', "INTO OUTFILE is not allowed"),
-        (r'INTO\s+DUMPFILE', "INTO DUMPFILE is not allowed"),
-        (r'LOAD_FILE', "LOAD_FILE is not allowed"),
-        (r'BENCHMARK\s*\(', "BENCHMARK is not allowed"),
-        (r'SLEEP\s*\(', "SLEEP is not allowed"),
-    ]
-    
-    for pattern, error_msg in suspicious_patterns:
-        if re.search(pattern, query_upper):
+    # 4. Check for suspicious patterns
+    for pattern, error_msg in SUSPICIOUS_PATTERNS:
+        if pattern.search(query_no_comments):
             return False, error_msg
     
     return True, ""
 
 
-def sanitize_query(query: str) -> str:
+def _sanitize_query(query: str) -> str:
     """
     Sanitizes a query by removing leading/trailing whitespace
     and normalizing line endings.
@@ -103,6 +130,24 @@ def sanitize_query(query: str) -> str:
     return query
 
 
+_validate_query_cached = lru_cache(maxsize=QUERY_CACHE_SIZE)(_validate_query)
+_sanitize_query_cached = lru_cache(maxsize=QUERY_CACHE_SIZE)(_sanitize_query)
+
+
+def validate_query(query: str) -> Tuple[bool, str]:
+    """Validate a query (see _validate_query), caching results for normal-length queries"""
+    if query and len(query) <= MAX_QUERY_LENGTH:
+        return _validate_query_cached(query)
+    return _validate_query(query)
+
+
+def sanitize_query(query: str) -> str:
+    """Sanitize a query (see _sanitize_query), caching results for normal-length queries"""
+    if query and len(query) <= MAX_QUERY_LENGTH:
+        return _sanitize_query_cached(query)
+    return _sanitize_query(query)
+
+
 def get_blocked_keywords() -> list:
     """Returns list of blocked SQL keywords for frontend display"""
     return BLOCKED_KEYWORDS.copy()